@@ -4,7 +4,11 @@
 
 import os
 from flask import Flask, Response, request
-from flask_webhook_server import BaseWebhook, GithubWebhook, RtmApi, BasePacket
+from flask_webhook_server import (BaseWebhook, GithubWebhook, JiraWebhook, RtmApi,
+                                  BasePacket, WorkerPool, DeliverySpool, DeliveryCache, REGISTRY,
+                                  Profiler, CaptureLog, FileTokenBucket, CircuitBreaker,
+                                  Coalescer, TaskIndex, RetryPolicy, RetryScheduler,
+                                  DeadLetterStore)
 import dotenv
 # from threading import Thread
 import time
@@ -18,15 +22,82 @@ except:
 app = Flask(__name__)
 app.logger.setLevel('DEBUG')
 
-github = GithubWebhook(app, app.logger)
-rtmilk = RtmApi(app, app.logger)
+# Set WEBHOOK_WORKERS to acknowledge deliveries with a 202 and process them
+# on a bounded pool of background workers
+pool = None
+if 'WEBHOOK_WORKERS' in os.environ:
+    pool = WorkerPool(app.logger,
+                      workers=int(os.environ['WEBHOOK_WORKERS']),
+                      queue_size=int(os.environ.get('WEBHOOK_QUEUE_SIZE', 64)))
+
+# Set WEBHOOK_SPOOL to log every delivery to disk before dispatch. With
+# WEBHOOK_SPOOL_ONLY the web process only spools, and worker.py dispatches
+spool = None
+if 'WEBHOOK_SPOOL' in os.environ:
+    spool = DeliverySpool(os.environ['WEBHOOK_SPOOL'])
+
+# Redeliveries are dropped for an hour; WEBHOOK_DEDUPE_DB shares the record
+# between gunicorn workers
+dedupe = DeliveryCache(path=os.environ.get('WEBHOOK_DEDUPE_DB', None))
+
+# WEBHOOK_PROFILE_RATE profiles 1 in N deliveries, WEBHOOK_SLOW_TARGET logs
+# targets slower than the given number of seconds. WEBHOOK_DEBUG_TOKEN mounts
+# /debug/tracemalloc for requests bearing that token
+profiler = None
+if 'WEBHOOK_PROFILE_RATE' in os.environ or 'WEBHOOK_SLOW_TARGET' in os.environ:
+    slow_target = os.environ.get('WEBHOOK_SLOW_TARGET', None)
+    profiler = Profiler(app.logger,
+                        directory=os.environ.get('WEBHOOK_PROFILE_DIR', './profiles'),
+                        sample_rate=int(os.environ.get('WEBHOOK_PROFILE_RATE', 0)),
+                        slow_target=float(slow_target) if slow_target else None)
+    if 'WEBHOOK_DEBUG_TOKEN' in os.environ:
+        profiler.init_app(app, '/debug/tracemalloc', token=os.environ['WEBHOOK_DEBUG_TOKEN'])
+
+# WEBHOOK_COALESCE_WINDOW runs the targets once per burst of pull request
+# events, after the given number of quiet seconds. Held bursts are in memory
+# only, so coalescing is not available with WEBHOOK_SPOOL
+coalescer = None
+if 'WEBHOOK_COALESCE_WINDOW' in os.environ:
+    if spool is None:
+        coalescer = Coalescer(app.logger, window=float(os.environ['WEBHOOK_COALESCE_WINDOW']))
+    else:
+        app.logger.warning('WEBHOOK_COALESCE_WINDOW is ignored with WEBHOOK_SPOOL')
+
+# GitHub caps payloads at 25 MB. Bodies over WEBHOOK_STREAM_THRESHOLD bytes
+# are streamed to a temporary file rather than held in memory
+max_size = int(os.environ.get('WEBHOOK_MAX_SIZE', 25 * 1024 * 1024))
+stream_threshold = int(os.environ.get('WEBHOOK_STREAM_THRESHOLD', 1024 * 1024))
+
+# WEBHOOK_DEAD_LETTERS isolates failing targets: the delivery still succeeds,
+# the target is retried WEBHOOK_RETRIES times with jittered backoff, then
+# written to the store for deadletters.py to replay
+retry, dead_letters = None, None
+if 'WEBHOOK_DEAD_LETTERS' in os.environ:
+    dead_letters = DeadLetterStore(os.environ['WEBHOOK_DEAD_LETTERS'])
+    retry = RetryScheduler(app.logger,
+                           RetryPolicy(retries=int(os.environ.get('WEBHOOK_RETRIES', 3)),
+                                       base=float(os.environ.get('WEBHOOK_RETRY_BASE', 2.0))))
+
+github = GithubWebhook(app, app.logger, pool=pool, spool=spool,
+                       spool_only='WEBHOOK_SPOOL_ONLY' in os.environ,
+                       dedupe=dedupe, profiler=profiler, coalescer=coalescer,
+                       max_size=max_size, stream_threshold=stream_threshold,
+                       retry=retry, dead_letters=dead_letters)
+# One RTM rate limit shared by every gunicorn worker on the dyno
+rtm_limiter = FileTokenBucket(os.environ.get('RTM_RATE_FILE', './.rtm_rate.json'),
+                              rate=1.0, capacity=3)
+# Tasks that already exist in RTM are not created again
+rtmilk = RtmApi(app, app.logger, warmup=True, limiter=rtm_limiter,
+                breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30),
+                task_index=TaskIndex(os.environ.get('RTM_TASK_DB', './rtm_tasks.db')))
+
+REGISTRY.init_app(app, '/metrics')
 
 github.register(event=('star', 'created'), function=rtmilk.yeah_boi)
 
+# Independent targets - run side by side rather than one after the other
 github.register(event=('pull_request', 'review_requested'),
-                function=rtmilk.yeah_boi)
-github.register(event=('pull_request', 'review_requested'),
-                function=rtmilk.create_task)
+                function=[rtmilk.yeah_boi, rtmilk.create_task], concurrent=True)
 
 github.register(event=('pull_request', 'opened'),
                 function=rtmilk.yeah_boi)
@@ -50,12 +121,34 @@ def hello_world():
     return Response('This is the welcome screen', 200)
 
 
-@github.hook('/github', methods=['POST', 'GET'])
+# WEBHOOK_CAPTURE_DIR records raw deliveries for replay.py
+capture = None
+if 'WEBHOOK_CAPTURE_DIR' in os.environ:
+    capture = CaptureLog(os.environ['WEBHOOK_CAPTURE_DIR'])
+
+
+@github.hook('/github', methods=['POST', 'GET'],
+             secret=os.environ.get('GITHUB_WEBHOOK_SECRET', None),
+             capture=capture)
 def on_github_post():
-    head = request.headers
-    data = request.json
+    delivery = github.delivery
     app.logger.info(
-        f"Teardown function following event '{head['X-Github-Event']} {data['action']}'")
+        f"Teardown function following event '{delivery.header('X-Github-Event')} {delivery.get('action')}'")
+
+    return None
+
+
+jira = JiraWebhook(app, app.logger, dedupe=dedupe, profiler=profiler,
+                   max_size=max_size, stream_threshold=stream_threshold,
+                   retry=retry, dead_letters=dead_letters)
+jira.register(event=('issue', 'created'), function=rtmilk.create_task)
+
+
+@jira.hook('/jira', methods=['POST'],
+           secret=os.environ.get('JIRA_WEBHOOK_SECRET', None),
+           capture=capture)
+def on_jira_post():
+    app.logger.info(f"Teardown function following Jira event '{jira.get_event_name()}'")
 
     return None
 
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# asyncio variant of app.py - run with `uvicorn asgi_app:app`
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask_webhook_server import (AsyncGithubWebhook, AsyncRtmApi, DeliveryCache,
+                                  FileTokenBucket, CircuitBreaker)
+import dotenv
+
+try:
+    LOCAL_ENVS = './.env'
+    dotenv.load_dotenv(LOCAL_ENVS)
+except:
+    pass
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger('asgi_app')
+
+# Sync targets run on this pool; coroutine targets run on the event loop
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('WEBHOOK_WORKERS', 16)))
+
+github = AsyncGithubWebhook(logger, executor=executor,
+                            dedupe=DeliveryCache(path=os.environ.get('WEBHOOK_DEDUPE_DB', None)))
+rtm_limiter = FileTokenBucket(os.environ.get('RTM_RATE_FILE', './.rtm_rate.json'),
+                              rate=1.0, capacity=3)
+rtmilk = AsyncRtmApi(None, logger, warmup=True, limiter=rtm_limiter,
+                     breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+
+github.register(event=('star', 'created'), function=rtmilk.yeah_boi)
+
+github.register(event=('pull_request', 'review_requested'),
+                function=[rtmilk.yeah_boi, rtmilk.acreate_task], concurrent=True)
+
+github.register(event=('pull_request', 'opened'),
+                function=rtmilk.yeah_boi)
+github.register(event=('pull_request', 'reopened'),
+                function=rtmilk.yeah_boi)
+github.register(event=('pull_request', 'assigned'),
+                function=rtmilk.yeah_boi)
+github.register(event=('pull_request', 'unassigned'),
+                function=rtmilk.yeah_boi)
+
+
+@github.hook('/github', secret=os.environ.get('GITHUB_WEBHOOK_SECRET', None))
+def on_github_post():
+    delivery = github.delivery
+    logger.info(
+        f"Teardown function following event '{delivery.header('X-Github-Event')} {delivery.get('action')}'")
+
+    return None
+
+
+app = github
@@ -0,0 +1,119 @@
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Thread
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeRtmServer(object):
+    """
+    Local stand-in for the RTM REST API.
+
+    Answers the methods RtmApi uses with canned JSON after `latency` seconds,
+    and fails a fraction `error_rate` of calls with a 503.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0) -> None:
+
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls: dict = {}
+        self.tasks: list = []
+        self._ids = count(1)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                server._handle(self)
+
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/services/rest/"
+
+    def start(self) -> 'FakeRtmServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+
+        params = parse_qs(urlparse(request.path).query)
+        method = params.get('method', [''])[0]
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.error_rate and random.random() < self.error_rate:
+            status, body = 503, {'rsp': {'stat': 'fail', 'err': {'code': '503', 'msg': 'Service unavailable'}}}
+        else:
+            status, body = 200, self._respond(method, params)
+
+        data = json.dumps(body).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _respond(self, method: str, params: dict) -> dict:
+
+        if method == 'rtm.timelines.create':
+            return {'rsp': {'stat': 'ok', 'timeline': str(next(self._ids))}}
+
+        if method == 'rtm.auth.checkToken':
+            return {'rsp': {'stat': 'ok', 'auth': {'token': params.get('auth_token', [''])[0], 'perms': 'delete'}}}
+
+        if method == 'rtm.tasks.add':
+            series = self._series(params.get('name', [''])[0])
+            self.tasks.append(series)
+            return {'rsp': {'stat': 'ok', 'transaction': {'id': series['id'], 'undoable': '0'},
+                            'list': {'id': '1', 'taskseries': [series]}}}
+
+        if method == 'rtm.tasks.getList':
+            series = list(self.tasks)
+            return {'rsp': {'stat': 'ok', 'tasks': {'rev': '1', 'list': [
+                {'id': '1', 'taskseries': series}] if series else []}}}
+
+        return {'rsp': {'stat': 'ok'}}
+
+    def _series(self, smart: str) -> dict:
+        """A taskseries for a smart-add string, parsing tags, priority and URL"""
+
+        task_id = str(next(self._ids))
+        name, tags, priority, url = [], [], 'N', ''
+        for word in smart.split(' '):
+            if word.startswith('#'):
+                tags.append(word[1:])
+            elif word.startswith('!'):
+                priority = word[1:]
+            elif word.startswith('http'):
+                url = word
+            else:
+                name.append(word)
+
+        return {'id': task_id, 'name': ' '.join(name), 'url': url,
+                'tags': {'tag': tags} if tags else [], 'notes': [],
+                'participants': [], 'created': '', 'modified': '',
+                'task': [{'id': task_id, 'due': '', 'added': '', 'completed': '',
+                          'deleted': '', 'priority': priority, 'postponed': '0',
+                          'estimate': ''}]}
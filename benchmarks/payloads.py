@@ -0,0 +1,134 @@
+import json
+import random
+import string
+from typing import List, Tuple
+
+# (event, headers, raw body)
+Delivery = Tuple[str, dict, bytes]
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return ' '.join(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+                    for _ in range(words))
+
+
+def _user(rng: random.Random) -> dict:
+    login = ''.join(rng.choice(string.ascii_lowercase) for _ in range(8))
+    return {
+        'login': login,
+        'id': rng.randint(1, 10 ** 8),
+        'node_id': 'MDQ6VXNlcj' + login,
+        'avatar_url': f'https://avatars.githubusercontent.com/u/{login}?v=4',
+        'url': f'https://api.github.com/users/{login}',
+        'html_url': f'https://github.com/{login}',
+        'type': 'User',
+        'site_admin': False,
+    }
+
+
+def _repository(rng: random.Random, name: str, owner: dict) -> dict:
+    full_name = f"{owner['login']}/{name}"
+    repo = {
+        'id': rng.randint(1, 10 ** 8),
+        'name': name,
+        'full_name': full_name,
+        'private': False,
+        'owner': owner,
+        'html_url': f'https://github.com/{full_name}',
+        'description': _text(rng, 12),
+        'fork': False,
+        'url': f'https://api.github.com/repos/{full_name}',
+        'default_branch': 'main',
+        'stargazers_count': rng.randint(0, 5000),
+        'open_issues_count': rng.randint(0, 300),
+    }
+    # GitHub repositories carry ~40 templated *_url fields
+    for key in ('forks', 'keys', 'collaborators', 'teams', 'hooks', 'issue_events', 'events',
+                'assignees', 'branches', 'tags', 'blobs', 'git_tags', 'git_refs', 'trees',
+                'statuses', 'languages', 'stargazers', 'contributors', 'subscribers',
+                'subscription', 'commits', 'git_commits', 'comments', 'issue_comment',
+                'contents', 'compare', 'merges', 'archive', 'downloads', 'issues', 'pulls',
+                'milestones', 'notifications', 'labels', 'releases', 'deployments'):
+        repo[f'{key}_url'] = f'https://api.github.com/repos/{full_name}/{key}'
+    return repo
+
+
+def star(rng: random.Random, action: str = 'created') -> Delivery:
+
+    owner = _user(rng)
+    body = {
+        'action': action,
+        'starred_at': '2021-05-01T12:00:00Z',
+        'repository': _repository(rng, 'flask-webhook-server', owner),
+        'sender': _user(rng),
+    }
+    return 'star', {'X-Github-Event': 'star'}, json.dumps(body).encode('utf-8')
+
+
+def pull_request(rng: random.Random, action: str = 'opened', size: int = 40) -> Delivery:
+    """A pull_request delivery of roughly `size` KB"""
+
+    owner = _user(rng)
+    repo = _repository(rng, 'flask-webhook-server', owner)
+    number = rng.randint(1, 5000)
+    pr_url = f"{repo['url']}/pulls/{number}"
+    body = {
+        'action': action,
+        'number': number,
+        'pull_request': {
+            'url': pr_url,
+            'id': rng.randint(1, 10 ** 9),
+            'html_url': f"{repo['html_url']}/pull/{number}",
+            'diff_url': f"{repo['html_url']}/pull/{number}.diff",
+            'state': 'open',
+            'title': _text(rng, 8),
+            'user': _user(rng),
+            'body': '',
+            'labels': [{'name': _text(rng, 1), 'color': 'ededed'} for _ in range(5)],
+            'requested_reviewers': [_user(rng) for _ in range(3)],
+            'assignees': [_user(rng) for _ in range(2)],
+            'head': {'ref': 'feature', 'sha': '%040x' % rng.getrandbits(160), 'repo': repo},
+            'base': {'ref': 'main', 'sha': '%040x' % rng.getrandbits(160), 'repo': repo},
+            'commits': rng.randint(1, 30),
+            'additions': rng.randint(1, 3000),
+            'deletions': rng.randint(1, 3000),
+            'changed_files': rng.randint(1, 80),
+        },
+        'repository': repo,
+        'sender': _user(rng),
+    }
+
+    # Pad the description up to the requested size
+    current = len(json.dumps(body))
+    if current < size * 1024:
+        body['pull_request']['body'] = _text(rng, (size * 1024 - current) // 6)
+
+    return 'pull_request', {'X-Github-Event': 'pull_request'}, json.dumps(body).encode('utf-8')
+
+
+def corpus(count: int = 500, seed: int = 1) -> List[Delivery]:
+    """Deterministic mix of star and pull_request deliveries"""
+
+    rng = random.Random(seed)
+    mix = [
+        (0.2, lambda: star(rng, 'created')),
+        (0.05, lambda: star(rng, 'deleted')),
+        (0.25, lambda: pull_request(rng, 'opened', size=rng.randint(20, 60))),
+        (0.2, lambda: pull_request(rng, 'review_requested', size=rng.randint(20, 60))),
+        (0.15, lambda: pull_request(rng, 'assigned', size=rng.randint(20, 60))),
+        (0.15, lambda: pull_request(rng, 'synchronize', size=rng.randint(20, 60))),
+    ]
+
+    deliveries = []
+    for i in range(count):
+        roll = rng.random()
+        for weight, make in mix:
+            roll -= weight
+            if roll <= 0:
+                break
+        event, headers, body = make()
+        headers = dict(headers, **{'X-GitHub-Delivery': f'bench-{seed}-{i}',
+                                   'Content-Type': 'application/json'})
+        deliveries.append((event, headers, body))
+
+    return deliveries
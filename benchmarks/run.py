@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of the webhook pipeline.
+
+Drives a corpus of GitHub star and pull_request deliveries through the Flask
+test client into GithubWebhook and RtmApi, with RTM replaced by a local fake
+server. Reports throughput, latency percentiles and peak allocation per
+delivery, and optionally saves the results for later comparison.
+
+    python -m benchmarks.run --deliveries 500 --latency 0.01 --save
+    python -m benchmarks.run --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from flask import Flask
+
+from flask_webhook_server import GithubWebhook, Metrics, RtmApi
+
+from .fake_rtm import FakeRtmServer
+from .payloads import corpus
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def build_app(rtm_url: str, state_dir: str, **webhook_options):
+    """The app.py wiring, pointed at the fake RTM server"""
+
+    for env in ('RTM_API_KEY', 'RTM_API_SECRET', 'RTM_API_TOKEN'):
+        os.environ.setdefault(env, 'benchmark')
+
+    logger = logging.getLogger('benchmark')
+    logger.setLevel('WARNING')
+
+    # Fail early if a mapping no longer fits the payloads being replayed
+    for event, headers, body in corpus(count=20):
+        GithubWebhook.mappings[event].validate(body, headers)
+
+    app = Flask('benchmark')
+    metrics = Metrics()
+    github = GithubWebhook(app, logger, metrics=metrics, **webhook_options)
+    rtmilk = RtmApi(app, logger, base_url=rtm_url, metrics=metrics,
+                    state_file=os.path.join(state_dir, 'rtm_state.json'))
+
+    github.register(event=('star', 'created'), function=rtmilk.yeah_boi)
+    github.register(event=('pull_request', 'review_requested'),
+                    function=[rtmilk.yeah_boi, rtmilk.create_task])
+    for action in ('opened', 'reopened', 'assigned', 'unassigned'):
+        github.register(event=('pull_request', action), function=rtmilk.yeah_boi)
+
+    @github.hook('/github', methods=['POST'])
+    def on_github_post():
+        return None
+
+    return app, github, rtmilk
+
+
+def percentile(values: list, pct: float) -> float:
+
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run(client, deliveries: list) -> dict:
+    """Post every delivery, returning latency and status statistics"""
+
+    latencies = []
+    statuses: dict = {}
+
+    start = time.perf_counter()
+    for _, headers, body in deliveries:
+        t0 = time.perf_counter()
+        rsp = client.post('/github', data=body, headers=headers)
+        latencies.append(time.perf_counter() - t0)
+        statuses[rsp.status_code] = statuses.get(rsp.status_code, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        'deliveries': len(deliveries),
+        'seconds': elapsed,
+        'throughput': len(deliveries) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'statuses': dict((str(k), v) for k, v in statuses.items()),
+    }
+
+
+def allocations(client, deliveries: list) -> dict:
+    """Mean and worst peak traced allocation per delivery"""
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _, headers, body in deliveries:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            client.post('/github', data=body, headers=headers)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'alloc_peak_mean_kb': statistics.mean(peaks) / 1024,
+        'alloc_peak_max_kb': max(peaks) / 1024,
+    }
+
+
+def git_revision() -> str:
+
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: dict, baseline: dict) -> None:
+
+    print(f"\nCompared with {baseline.get('revision')} ({baseline.get('timestamp')}):")
+    for key in ('throughput', 'p50_ms', 'p99_ms', 'mean_ms', 'alloc_peak_mean_kb'):
+        if not baseline.get(key) or key not in results:
+            continue
+        change = (results[key] - baseline[key]) / baseline[key] * 100
+        print(f"  {key:<20} {baseline[key]:>10.2f} -> {results[key]:>10.2f}  ({change:+.1f}%)")
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description="Benchmark the webhook pipeline")
+    parser.add_argument('--deliveries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds of latency added by the fake RTM server")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="fraction of fake RTM calls answered with a 503")
+    parser.add_argument('--alloc-sample', type=int, default=100,
+                        help="deliveries to trace for allocation figures (0 to skip)")
+    parser.add_argument('--save', action='store_true',
+                        help=f"write the results to {RESULTS_DIR}")
+    parser.add_argument('--compare', metavar='RESULTS',
+                        help="results file to compare against")
+    args = parser.parse_args()
+
+    deliveries = corpus(args.deliveries, args.seed)
+    server = FakeRtmServer(latency=args.latency, error_rate=args.error_rate).start()
+
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            app, github, rtmilk = build_app(server.url, state_dir)
+            client = app.test_client()
+
+            # Warm up imports, the RTM state and the routing table
+            run(client, deliveries[:10])
+
+            results = run(client, deliveries)
+            if args.alloc_sample:
+                results.update(allocations(client, deliveries[:args.alloc_sample]))
+    finally:
+        server.stop()
+
+    results.update({
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'options': vars(args),
+        'rtm_calls': server.calls,
+        'body_kb': sum(len(body) for _, _, body in deliveries) / len(deliveries) / 1024,
+    })
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.compare:
+        with open(args.compare) as handle:
+            compare(results, json.load(handle))
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{results['revision']}.json")
+        with open(path, 'w') as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+        print(f"\nSaved results to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Inspect and replay the dead letter store.
+
+Targets that still fail after their retries, and deliveries that fail to
+parse, are written to WEBHOOK_DEAD_LETTERS. Replaying a letter re-runs its
+target alone with the stored packet, or the whole pipeline for a delivery
+that never parsed; letters that succeed are removed.
+
+    WEBHOOK_DEAD_LETTERS=./deadletter.db python deadletters.py list
+    WEBHOOK_DEAD_LETTERS=./deadletter.db python deadletters.py replay [ID ...] [--all]
+    WEBHOOK_DEAD_LETTERS=./deadletter.db python deadletters.py drop ID [ID ...]
+"""
+import argparse
+import time
+
+from app import app, github, jira
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Inspect and replay dead letters")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_cmd = commands.add_parser('list', help="show stored letters, oldest first")
+    list_cmd.add_argument('--limit', type=int, default=100)
+
+    replay_cmd = commands.add_parser('replay', help="re-run letters, removing those that succeed")
+    replay_cmd.add_argument('ids', type=int, nargs='*')
+    replay_cmd.add_argument('--all', action='store_true')
+
+    drop_cmd = commands.add_parser('drop', help="delete letters without replaying them")
+    drop_cmd.add_argument('ids', type=int, nargs='+')
+    args = parser.parse_args()
+
+    store = github.dead_letters
+    if store is None:
+        parser.error("WEBHOOK_DEAD_LETTERS is not set")
+
+    webhooks = dict([(webhook.__name__, webhook) for webhook in (github, jira)])
+
+    if args.command == 'list':
+        for letter in store.list(limit=args.limit):
+            created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(letter.created))
+            print(f"{letter.id:>6}  {created}  {letter.webhook}  {letter.event}  "
+                  f"{letter.target or '<parse>'}  x{letter.attempts}  {letter.error}")
+
+    elif args.command == 'drop':
+        for letter_id in args.ids:
+            store.remove(letter_id)
+        app.logger.info(f'Dropped {len(args.ids)} dead letters')
+
+    else:
+        if not args.ids and not args.all:
+            parser.error("give letter ids or --all")
+
+        letters = store.list(limit=len(store)) if args.all else \
+            [letter for letter in map(store.get, args.ids) if letter is not None]
+
+        replayed = 0
+        for letter in letters:
+            webhook = webhooks.get(letter.webhook)
+            if webhook is None:
+                app.logger.error(f'Dead letter {letter.id}: unknown webhook {letter.webhook}')
+                continue
+            try:
+                webhook.replay_dead_letter(letter)
+            except Exception:
+                app.logger.exception(f'Dead letter {letter.id} failed again')
+                continue
+            store.remove(letter.id)
+            replayed += 1
+
+        app.logger.info(f'Replayed {replayed} of {len(letters)} dead letters')
@@ -1,5 +1,26 @@
 from .base import BaseWebhook, AbstractConnector, BasePacket
 
-from .rtm import RtmWehook, RtmConnector, RtmApi
+from .workers import WorkerPool
+from .executors import Executor, ThreadExecutor, GeventExecutor, ProcessExecutor
+from .spool import DeliverySpool
+from .routing import EventRouter, Tenant, TenantTable, WILDCARD
+from .codec import Codec, get_codec
+from .payload import Delivery, PayloadTooLarge
+from .mapping import PacketMapping
+from .dedupe import DeliveryCache
+from .metrics import Metrics, REGISTRY
+from .profiling import Profiler
+from .capture import CaptureLog
+from .coalesce import Coalescer
+from .retry import RetryPolicy, RetryScheduler
+from .deadletter import DeadLetter, DeadLetterStore
+from .limits import TokenBucket, FileTokenBucket, CircuitBreaker, CircuitOpenError
+
+from .tasks import RtmTask, TaskIndex
+from .rtm import RtmWehook, RtmConnector, RtmApi, AsyncRtmApi
 
 from .github import GithubWebhook
+
+from .jira import JiraWebhook
+
+from .asgi import AsyncWebhook, AsyncGithubWebhook
@@ -0,0 +1,317 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional, Tuple, Union
+from logging import Logger
+
+from .base import AbstractWebhook, BasePacket, Hook
+from .codec import Codec, get_codec
+from .dedupe import DeliveryCache
+from .github import GithubParser
+from .metrics import Metrics, REGISTRY, func_label
+from .payload import Delivery
+from .routing import EventRouter, Route, Tenant, TenantTable
+from .security import verify_signature
+
+_current_delivery: contextvars.ContextVar = contextvars.ContextVar('delivery')
+_current_hook: contextvars.ContextVar = contextvars.ContextVar('hook', default=None)
+
+
+class Headers(dict):
+    """Case-insensitive header mapping built from an ASGI scope"""
+
+    def __init__(self, raw: list) -> None:
+        super().__init__((k.decode('latin-1').lower(), v.decode('latin-1')) for k, v in raw)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return super().get(key.lower(), default)
+
+    def __getitem__(self, key: str) -> Any:
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and super().__contains__(key.lower())
+
+
+class AsyncWebhook(AbstractWebhook):
+    """
+    ASGI counterpart of BaseWebhook, with the same hook/register/resolve API.
+
+    Targets and closers may be coroutine functions, which are awaited on the
+    event loop, or plain functions, which are run on `executor` (the loop's
+    default thread pool when None) so they cannot block other deliveries.
+    During a delivery `self.delivery` returns the current Delivery, as it
+    does on the Flask receiver.
+
+    Run it with any ASGI server, e.g. `uvicorn asgi_app:app`.
+    """
+
+    __name__: str = "AsyncWebhook"
+    events: list = [
+        None,
+        'tagged'
+    ]
+
+    delivery_header: Optional[str] = None
+    signature_header: Optional[str] = None
+    event_header: Optional[str] = None
+
+    def __init__(self, logger: Logger, codec: Codec = None,
+                 executor: Executor = None, dedupe: DeliveryCache = None,
+                 metrics: Metrics = None) -> None:
+
+        self.logger = logger
+        self.codec = codec or get_codec()
+        self.executor = executor
+        self.dedupe = dedupe
+        self.metrics = metrics or REGISTRY
+
+        self.hooks: dict = {}
+
+        self.router = EventRouter(self.events, parsers=self._parsers(),
+                                  parser_key=self.parser_key)
+        self.targets: dict = self.router.targets
+        self.closers: dict = self.router.closers
+
+        self.tenants = TenantTable(self.events, parsers=self.router.parsers,
+                                   parser_key=self.parser_key)
+
+    def hook(self, rule: str, secret: Union[str, bytes, None] = None,
+             max_size: Optional[int] = None, **kwargs: Any) -> Callable:
+        """
+        Registers a function as a hook on a path. Only POST is accepted, and
+        bodies over max_size bytes are rejected with a 413.
+        """
+
+        if secret and self.signature_header is None:
+            raise Exception(f"{self.__name__} does not support signed deliveries")
+
+        def decorator(func: Callable) -> None:
+            self.logger.info(f"{self.__name__}: Registered endpoint - {rule}")
+            self.hooks[rule] = Hook(rule, func, secret=secret, max_size=max_size)
+            return None
+
+        return decorator
+
+    def register(self, event: Any = None, function: Union[Callable, list] = [],
+                 concurrent: bool = False, after: Union[Callable, list] = (),
+                 fields: list = ()) -> None:
+        """
+        Register a downstream function or coroutine function. Concurrent
+        targets are gathered - see BaseWebhook.register
+        """
+
+        if event not in self.targets.keys() and not EventRouter.is_pattern(event):
+            raise Exception()
+
+        if isinstance(function, Callable):
+            function = [function]
+        if isinstance(after, Callable):
+            after = [after]
+
+        for func in function:
+            self.router.add_target(event, func, concurrent=concurrent, after=after,
+                                   fields=fields)
+
+        return None
+
+    def tenant(self, **key: Any) -> Tenant:
+        """Registration handle for one tenant - see BaseWebhook.tenant"""
+
+        if len(key) != 1:
+            raise Exception("tenant() takes exactly one key, e.g. repository='octo/app'")
+
+        (kind, value), = key.items()
+        return self.tenants.tenant(kind, value)
+
+    def tenant_keys(self) -> list:
+
+        return []
+
+    def route(self, event: Any) -> Optional[Route]:
+        """The route for an event, including the current delivery's tenant"""
+
+        route = self.router.route(event)
+        if not self.tenants or event is None:
+            # None is also the event of a delivery that failed to parse -
+            # reading its tenant keys would decode the bad body again
+            return route
+
+        return self.tenants.route(route, event, self.tenant_keys())
+
+    @property
+    def delivery(self) -> Delivery:
+        """The delivery being handled by the current task"""
+
+        return _current_delivery.get()
+
+    def parse(self, request: Any = None) -> Tuple[Any, BasePacket]:
+
+        return None, None
+
+    def parser_key(self, event: Any) -> Any:
+
+        return event
+
+    def _parsers(self) -> dict:
+
+        return {}
+
+    def receive(self) -> Tuple[Any, BasePacket]:
+        """Parse the current delivery into (event, packet)"""
+
+        event, packet = self.parse()
+        if self.route(event) is None:
+            raise Exception()
+
+        return event, packet
+
+    async def dispatch(self, event: Any, packet: BasePacket) -> None:
+        """Run the targets and closers registered for an event"""
+
+        route = self.route(event)
+        if route is None:
+            return None
+
+        closers = route.closers
+        hook = _current_hook.get()
+        if hook is not None:
+            closers += (hook.closer,)
+
+        for stage in route.stages:
+            results = await asyncio.gather(
+                *[self._run(event, 'target', target, packet) for target in stage],
+                return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+
+        for closer in closers:
+            await self._run(event, 'closer', closer)
+
+        return None
+
+    async def resolve(self, delivery: Delivery, hook: Hook = None) -> None:
+
+        token = _current_delivery.set(delivery)
+        hook_token = _current_hook.set(hook)
+        try:
+            event, packet = self.receive()
+            await self.dispatch(event, packet)
+        finally:
+            _current_hook.reset(hook_token)
+            _current_delivery.reset(token)
+
+        return None
+
+    async def _run(self, event: Any, stage: str, func: Callable, *args: Any) -> Any:
+        """Await a coroutine function, or offload a sync one to the executor"""
+
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(func):
+                return await func(*args)
+
+            # Carry the current delivery over to the worker thread
+            context = contextvars.copy_context()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, context.run, func, *args)
+        finally:
+            self.metrics.observe('webhook_stage_seconds', time.perf_counter() - start,
+                                 webhook=self.__name__, event=self.router.label(event),
+                                 stage=stage, func=func_label(func))
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """ASGI entry point"""
+
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        if scope['type'] != 'http':
+            return
+
+        hook = self.hooks.get(scope['path'], None)
+        if hook is None:
+            return await self._respond(send, 404, "Not found")
+        if scope['method'] != 'POST':
+            return await self._respond(send, 405, "Method not allowed")
+
+        # Decide from the headers alone, before the body is read - see
+        # BaseWebhook.precheck
+        headers = Headers(scope['headers'])
+        if self.event_header is not None:
+            event_type = headers.get(self.event_header, None)
+            if not (self.router.has_subscribers(event_type)
+                    or self.tenants.has_subscribers(event_type)):
+                self.metrics.inc('webhook_skipped_total', webhook=self.__name__,
+                                 reason='unsubscribed')
+                return await self._respond(send, 200, "Event not subscribed")
+
+        length = headers.get('content-length', None)
+        if length is not None:
+            try:
+                # int() also accepts signs, underscores and non-ASCII digits
+                if not (length.isascii() and length.strip().isdigit()):
+                    raise ValueError(length)
+                length = int(length)
+            except ValueError:
+                self.logger.warning(f"Malformed Content-Length on {scope['path']} - sending response: 400")
+                return await self._respond(send, 400, "Malformed Content-Length")
+        if hook.max_size and length is not None and length > hook.max_size:
+            return await self._respond(send, 413, "Payload too large")
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body.extend(message.get('body', b''))
+            if hook.max_size and len(body) > hook.max_size:
+                return await self._respond(send, 413, "Payload too large")
+            if not message.get('more_body', False):
+                break
+
+        delivery = Delivery(headers, bytes(body), self.codec)
+
+        if hook.secret:
+            signature = headers.get(self.signature_header, None)
+            if not verify_signature(hook.secret, delivery.body, signature):
+                self.logger.warning(f"Invalid signature on {scope['path']} - sending response: 401")
+                return await self._respond(send, 401, "Invalid signature")
+
+        delivery_id = None
+        if self.dedupe is not None and self.delivery_header is not None:
+            delivery_id = headers.get(self.delivery_header, None)
+            if delivery_id and self.dedupe.seen(delivery_id):
+                return await self._respond(send, 200, "Duplicate delivery")
+
+        try:
+            await self.resolve(delivery, hook)
+        except Exception:
+            self.logger.exception(f"{self.__name__}: failed to resolve delivery")
+            if delivery_id:
+                self.dedupe.forget(delivery_id)
+            return await self._respond(send, 500, "Internal server error")
+
+        return await self._respond(send, 200, "This is final response")
+
+    async def _respond(self, send: Callable, status: int, text: str) -> None:
+
+        body = text.encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                                (b'content-length', str(len(body)).encode('ascii'))]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+class AsyncGithubWebhook(GithubParser, AsyncWebhook):
+
+    __name__: str = "AsyncGithubWebhook"
+
+    def __init__(self, logger: Logger, **kwargs):
+        super().__init__(logger=logger, **kwargs)
@@ -1,13 +1,30 @@
 from abc import ABC, abstractmethod
+import sys
 from threading import Thread
-from typing import Callable, Optional, Union, Any, Tuple
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Hashable, Optional, Union, Any, Tuple
 import time
-import gevent
 
-from flask import Flask, Request, Response, ctx, request, copy_current_request_context
+from flask import (Flask, Request, Response, ctx, request, copy_current_request_context,
+                   has_request_context)
 from logging import Logger
 import collections
 
+from .capture import CaptureLog
+from .coalesce import Coalescer
+from .codec import Codec, get_codec
+from .deadletter import DeadLetter, DeadLetterStore
+from .dedupe import DeliveryCache
+from .executors import Executor, ThreadExecutor
+from .metrics import Metrics, REGISTRY, event_label, func_label
+from .profiling import Profiler
+from .retry import RetryScheduler
+from .payload import Delivery, PayloadTooLarge
+from .routing import EventRouter, Route, Tenant, TenantTable
+from .security import verify_signature
+from .spool import DeliverySpool
+from .workers import WorkerPool
+
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Packets
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -18,6 +35,8 @@ class AbstractPacket(ABC):
     Interface/Metaclass for service packets
     """
 
+    __slots__ = ()
+
     @classmethod
     @abstractmethod
     def from_response(self, response: dict):
@@ -26,9 +45,27 @@ class AbstractPacket(ABC):
 
 class BasePacket(AbstractPacket):
     """
-    Docstring
+    The unit passed from webhooks to targets. Slotted, with interned tags,
+    and cheap to serialise for queues and spools via to_bytes/from_bytes.
     """
 
+    _fields: tuple = (
+        'id',
+        'sid',
+        'parent_id',
+        'parent_sid',
+        'name',
+        'description_short',
+        'description_long',
+        'notes',
+        'url',
+        'tags',
+        'location',
+        'people',
+        'priority',
+    )
+    __slots__ = _fields
+
     def __init__(self,
                  id: str = "",
                  sid: str = "",
@@ -37,11 +74,11 @@ class BasePacket(AbstractPacket):
                  name: str = "",
                  description_short: str = "",
                  description_long: str = "",
-                 notes: Union[list, str] = [],
+                 notes: Union[list, str] = None,
                  url: str = "",
-                 tags: Union[list, str] = [],
+                 tags: Union[list, str] = None,
                  location: str = "",
-                 people: list = [],
+                 people: list = None,
                  priority: str = ""
                  ) -> None:
 
@@ -52,17 +89,48 @@ class BasePacket(AbstractPacket):
         self.name = name
         self.description_short = description_short
         self.description_long = description_long
-        self.notes = [notes] if isinstance(notes, str) else notes
+        self.notes = _as_list(notes)
         self.url = url
-        self.tags = [tags] if isinstance(tags, str) else tags
+        self.tags = [sys.intern(tag) for tag in _as_list(tags)]
         self.location = location
-        self.people = people
+        self.people = _as_list(people)
         self.priority = priority
 
+    def to_dict(self) -> dict:
+        return dict([(field, getattr(self, field)) for field in self._fields])
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BasePacket':
+        return cls(**data)
+
+    def to_bytes(self, codec: Codec = None) -> bytes:
+        """Encode as a positional JSON array in `_fields` order"""
+
+        codec = codec or get_codec()
+        return codec.dumps([getattr(self, field) for field in self._fields])
+
+    @classmethod
+    def from_bytes(cls, data: bytes, codec: Codec = None) -> 'BasePacket':
+
+        codec = codec or get_codec()
+        return cls(**dict(zip(cls._fields, codec.loads(data))))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(name={self.name!r}, url={self.url!r}, tags={self.tags!r})"
+
     @classmethod
     def from_response(cls, response: dict) -> 'BasePacket':
         pass
 
+
+def _as_list(value: Union[list, str, None]) -> list:
+
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Connectors
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -145,6 +213,25 @@ class AbstractWebhook(ABC):
         pass
 
 
+class Hook(object):
+    """
+    Options for one endpoint registered through BaseWebhook.hook
+    """
+
+    def __init__(self, rule: str, closer: Callable,
+                 secret: Union[str, bytes, None] = None,
+                 capture: CaptureLog = None,
+                 max_size: Optional[int] = None,
+                 stream_threshold: Optional[int] = None) -> None:
+
+        self.rule = rule
+        self.closer = closer
+        self.secret = secret
+        self.capture = capture
+        self.max_size = max_size
+        self.stream_threshold = stream_threshold
+
+
 class BaseWebhook(AbstractWebhook):
     # https://github.com/bloomberg/python-github-webhook/blob/master/github_webhook/webhook.py
 
@@ -154,45 +241,470 @@ class BaseWebhook(AbstractWebhook):
         'tagged'
     ]
 
-    def __init__(self, app: Flask, logger: Logger = None) -> None:
+    # Header carrying a unique id per delivery, used to drop redeliveries
+    delivery_header: Optional[str] = None
+
+    # Header carrying the HMAC of the raw body, checked when a hook has a secret
+    signature_header: Optional[str] = None
+
+    # Header naming the event type, checked before the body is read - see precheck
+    event_header: Optional[str] = None
+
+    def __init__(self, app: Flask, logger: Logger = None,
+                 pool: WorkerPool = None, spool: DeliverySpool = None,
+                 spool_only: bool = False, codec: Codec = None,
+                 dedupe: DeliveryCache = None, metrics: Metrics = None,
+                 profiler: Profiler = None, executor: Executor = None,
+                 coalescer: Coalescer = None, max_size: Optional[int] = None,
+                 stream_threshold: int = 1024 * 1024, retry: RetryScheduler = None,
+                 dead_letters: DeadLetterStore = None) -> None:
         self.app = app
+        self.codec = codec or get_codec()
+        self.metrics = metrics or REGISTRY
 
         if logger is None:
             logger = app.logger
         self.logger = logger
 
-        self.targets: dict = dict([(evnt, []) for evnt in self.events])
-        self.closers: dict = dict([(evnt, []) for evnt in self.events])
+        # Opt-in acknowledge-then-process mode - see resolve_thread
+        self.pool = pool
+
+        # Durable delivery log. With spool_only, dispatch is left entirely to
+        # a separate drain worker - see drain
+        self.spool = spool
+        self.spool_only = spool_only
+
+        self.dedupe = dedupe
+        self.profiler = profiler
+
+        # Runs targets registered with concurrent=True. A thread pool is
+        # created on first use if none is given
+        self.executor = executor
+
+        # Holds bursts of related events back and runs their targets once -
+        # see coalesce_key. Held bursts live in memory, so a spool could only
+        # acknowledge deliveries whose targets have not run yet
+        if coalescer is not None and spool is not None:
+            raise Exception(f"{self.__name__}: a coalescer cannot be combined with a spool")
+        self.coalescer = coalescer
+
+        # Defaults for hooks that don't set their own - see hook
+        self.max_size = max_size
+        self.stream_threshold = stream_threshold
 
-    def hook(self, rule: str, **kwargs: Any) -> Callable:
+        # With either, a failing target no longer fails the delivery: it is
+        # retried off the request path and then dead-lettered - see _failed
+        self.retry = retry
+        self.dead_letters = dead_letters
+        self.isolate = retry is not None or dead_letters is not None
+
+        self.hooks: dict = {}
+
+        self.router = EventRouter(self.events, parsers=self._parsers(),
+                                  parser_key=self.parser_key)
+        self.targets: dict = self.router.targets
+        self.closers: dict = self.router.closers
+
+        # Per-tenant targets and closers - see tenant
+        self.tenants = TenantTable(self.events, parsers=self.router.parsers,
+                                   parser_key=self.parser_key)
+
+    def hook(self, rule: str, secret: Union[str, bytes, None] = None,
+             capture: CaptureLog = None, max_size: Optional[int] = None,
+             stream_threshold: Optional[int] = None, **kwargs: Any) -> Callable:
         """
-        Registers a function as a hook. 
+        Registers a function as a hook. With a secret, deliveries to the rule
+        must carry a valid signature_header or they are rejected with a 401
+        before the body is decoded. With a capture log, every request to the
+        rule within max_size is recorded as received, for replay.py - probes
+        and unsubscribed events included, though capturing them means their
+        bodies are read.
+
+        Bodies over max_size bytes are rejected with a 413. Bodies over
+        stream_threshold bytes, or of unknown length, are streamed to a
+        temporary file and memory-mapped instead of being buffered.
         """
 
+        if secret and self.signature_header is None:
+            raise Exception(f"{self.__name__} does not support signed deliveries")
+
         def decorator(func: Callable) -> None:
             self.logger.info(f"{self.__name__}: Registered endpoint - {rule}")
-            for event in self.closers.keys():
-                self.closers[event].append(func)
+            # The hooked function closes deliveries to this rule only - see dispatch
+            self.hooks[rule] = Hook(rule, func, secret=secret, capture=capture,
+                                    max_size=max_size, stream_threshold=stream_threshold)
 
-            endpoint = kwargs.pop("endpoint", None)
+            # One endpoint per rule, so several webhooks can share an app
+            endpoint = kwargs.pop("endpoint", None) or f"{self.__name__}:{rule}"
             self.app.add_url_rule(rule=rule, endpoint=endpoint, view_func=self.resolve_thread,
                                   **kwargs)
             return None
 
         return decorator
 
-    def resolve(self) -> None:
+    def tenant(self, **key: Any) -> Tenant:
+        """
+        Registration handle for one tenant, e.g. tenant(repository='octo/app').
+        Its targets and closers only run for deliveries whose tenant_keys
+        include that key, on top of those registered on the webhook itself.
+        """
+
+        if len(key) != 1:
+            raise Exception("tenant() takes exactly one key, e.g. repository='octo/app'")
+
+        (kind, value), = key.items()
+        return self.tenants.tenant(kind, value)
+
+    def tenant_keys(self) -> list:
+        """
+        Candidate tenant keys of the current delivery as (kind, value) pairs,
+        most specific first. The first key with registrations wins.
+        """
+
+        return []
+
+    def route(self, event: Any) -> Optional[Route]:
+        """The route for an event, including the current delivery's tenant"""
+
+        route = self.router.route(event)
+        if not self.tenants or event is None:
+            # None is also the event of a delivery that failed to parse -
+            # reading its tenant keys would decode the bad body again
+            return route
+
+        return self.tenants.route(route, event, self.tenant_keys())
+
+    def _current_hook(self) -> Optional[Hook]:
+
+        if not has_request_context() or request.url_rule is None:
+            return None
+        return self.hooks.get(request.url_rule.rule, None)
+
+    @property
+    def delivery(self) -> Delivery:
+        """The delivery being handled, decoded at most once per request"""
+
+        return Delivery.current(self.codec)
+
+    def receive(self) -> Tuple[Any, BasePacket]:
+        """Validate the current request and parse it into (event, packet)"""
 
-        self.logger.info("Thread started")
         event, packet = self.parse()
-        if event not in self.targets.keys():
+        if self.route(event) is None:
             raise Exception()
 
-        for target in self.targets[event]:
-            target(packet)
+        return event, packet
+
+    def dispatch(self, event: Any, packet: BasePacket) -> None:
+        """Run the targets and closers registered for an event"""
+
+        route = self.route(event)
+        if route is None:
+            return None
+
+        closers = route.closers
+        hook = self._current_hook()
+        if hook is not None:
+            closers += (hook.closer,)
+
+        timings = [] if self.profiler is not None else None
+
+        key = self.coalesce_key(event) if self.coalescer is not None else None
+        if key is not None:
+            # The closers run once the burst's targets have - see _coalesce
+            self._coalesce(key, event, packet, closers)
+            return None
+
+        self._run_targets(event, route.stages, packet, timings=timings)
+
+        # Every target has finished by now - closers always run last
+        self._run_closers(event, closers, timings=timings)
+
+        if timings is not None:
+            self.profiler.report(event_label(event), timings)
+
+        return None
+
+    def _run_closers(self, event: Any, closers: tuple, timings: list = None) -> None:
 
-        for closer in self.closers[event]:
-            closer()
+        for closer in closers:
+            try:
+                self._run(event, 'closer', closer, timings=timings)
+            except Exception:
+                if not self.isolate:
+                    raise
+                self.logger.exception(f"{self.__name__}: closer {func_label(closer)} failed")
+
+        return None
+
+    def _run_targets(self, event: Any, stages: tuple, packet: BasePacket,
+                     timings: list = None) -> None:
+
+        for stage in stages:
+            if len(stage) > 1:
+                self._run_stage(event, stage, packet, timings=timings)
+                continue
+
+            try:
+                self._run(event, 'target', stage[0], packet, timings=timings)
+            except Exception as err:
+                if not self.isolate:
+                    raise
+                self._failed(event, stage[0], packet, err)
+
+        return None
+
+    def coalesce_key(self, event: Any) -> Optional[Hashable]:
+        """
+        Key grouping events whose targets should run once per burst, or None
+        to dispatch the event straight away. Only used with a coalescer.
+        """
+
+        return None
+
+    def _coalesce(self, key: Hashable, event: Any, packet: BasePacket,
+                  closers: tuple = ()) -> None:
+        """
+        Hand an event to the coalescer, keeping the delivery for later. The
+        delivery's closers run under its own request once the burst fires.
+        """
+
+        path = request.path
+        headers = dict(request.headers)
+        body = bytes(self.delivery.body)
+
+        def callback(events: list, merged: BasePacket) -> None:
+            self._dispatch_burst(path, headers, body, events, merged)
+
+        def settle() -> None:
+            with self.app.test_request_context(path, method='POST', headers=headers,
+                                               data=body):
+                self._run_closers(event, closers)
+
+        if self.coalescer.submit(key, event, packet, callback, settle=settle):
+            self.metrics.inc('webhook_coalesced_total', webhook=self.__name__,
+                             event=self.router.label(event))
+
+        return None
+
+    def _dispatch_burst(self, path: str, headers: dict, body: bytes,
+                        events: list, packet: BasePacket) -> None:
+        """
+        Run the targets of every event in a burst once each, with the merged
+        packet and the last delivery of the burst as the current request
+        """
+
+        self.logger.info(f"{self.__name__}: dispatching {len(events)} coalesced events")
+
+        done: set = set()
+        with self.app.test_request_context(path, method='POST', headers=headers,
+                                           data=body):
+            for event in dict.fromkeys(events):
+                route = self.route(event)
+                if route is None:
+                    continue
+
+                stages = []
+                for stage in route.stages:
+                    stage = tuple(func for func in stage if func not in done)
+                    done.update(stage)
+                    if stage:
+                        stages.append(stage)
+
+                self._run_targets(event, tuple(stages), packet)
+
+        return None
+
+    def _receive(self) -> Tuple[Any, BasePacket]:
+        """
+        receive, recording the parse stage. With a dead letter store, a
+        delivery that fails to parse is dead-lettered whole and dispatched as
+        the None event, so only the closers run.
+        """
+
+        start = time.perf_counter()
+        try:
+            event, packet = self.receive()
+        except Exception as err:
+            if self.dead_letters is None:
+                raise
+            self.logger.exception(f"{self.__name__}: failed to parse delivery")
+            snapshot = (request.path, dict(request.headers), bytes(self.delivery.body))
+            self._dead_letter(None, None, None, snapshot, err)
+            return None, None
+
+        self.metrics.observe('webhook_stage_seconds', time.perf_counter() - start,
+                             webhook=self.__name__, event=self.router.label(event),
+                             stage='parse', func='')
+        return event, packet
+
+    def _run(self, event: Any, stage: str, func: Callable, *args: Any,
+             timings: list = None) -> Any:
+        """Call a target or closer, recording its latency and failures"""
+
+        name = func_label(func)
+        start = time.perf_counter()
+        try:
+            if self.profiler is None:
+                return func(*args)
+
+            with self.profiler.watch(f"{event_label(event)} {stage} {name}"):
+                return func(*args)
+        except Exception:
+            self.metrics.inc('webhook_stage_errors_total', webhook=self.__name__,
+                             event=self.router.label(event), stage=stage, func=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe('webhook_stage_seconds', elapsed,
+                                 webhook=self.__name__, event=self.router.label(event),
+                                 stage=stage, func=name)
+            if timings is not None:
+                timings.append((name, elapsed))
+
+    def _run_stage(self, event: Any, stage: tuple, packet: BasePacket,
+                   timings: list = None) -> None:
+        """
+        Run a stage of concurrent targets on the executor and wait for all of
+        them, re-raising the first failure once the stage has finished
+        """
+
+        if self.executor.shares_context:
+            calls = []
+            for target in stage:
+                func = self._run
+                if has_request_context():
+                    func = copy_current_request_context(func)
+                calls.append((func, (event, 'target', target, packet)))
+
+            outcomes = self.executor.run(calls)
+        else:
+            # Out-of-process targets are timed from here, as a stage
+            start = time.perf_counter()
+            outcomes = self.executor.run([(target, (packet,)) for target in stage])
+            elapsed = time.perf_counter() - start
+
+            for target, outcome in zip(stage, outcomes):
+                name = func_label(target)
+                if outcome.error is not None:
+                    self.metrics.inc('webhook_stage_errors_total', webhook=self.__name__,
+                                     event=self.router.label(event), stage='target', func=name)
+                self.metrics.observe('webhook_stage_seconds', elapsed,
+                                     webhook=self.__name__, event=self.router.label(event),
+                                     stage='target', func=name)
+                if timings is not None:
+                    timings.append((name, elapsed))
+
+        for target, outcome in zip(stage, outcomes):
+            if outcome.error is None:
+                continue
+            if not self.isolate:
+                raise outcome.error
+            self._failed(event, target, packet, outcome.error)
+
+        return None
+
+    def _failed(self, event: Any, target: Callable, packet: BasePacket,
+                error: Exception, attempt: int = 1, snapshot: tuple = None) -> None:
+        """
+        Handle a target that raised while isolation is on: schedule a retry
+        with backoff or, once retries run out, write a dead letter. `attempt`
+        is the number of calls made so far.
+        """
+
+        name = func_label(target)
+        if snapshot is None:
+            snapshot = (request.path, dict(request.headers), bytes(self.delivery.body))
+
+        if self.retry is not None and self.retry.schedule(
+                lambda: self._retry(snapshot, event, target, packet, attempt + 1), attempt):
+            self.logger.warning(f"{self.__name__}: {name} failed ({error!r}) - retry {attempt} scheduled")
+            self.metrics.inc('webhook_retries_total', webhook=self.__name__,
+                             event=self.router.label(event), func=name)
+            return None
+
+        self._dead_letter(event, name, packet, snapshot, error, attempt)
+        return None
+
+    def _retry(self, snapshot: tuple, event: Any, target: Callable, packet: BasePacket,
+               attempt: int) -> None:
+        """Call a failed target again, under its original request"""
+
+        path, headers, body = snapshot
+        with self.app.test_request_context(path, method='POST', headers=headers, data=body):
+            try:
+                self._run(event, 'target', target, packet)
+            except Exception as err:
+                self._failed(event, target, packet, err, attempt, snapshot)
+
+        return None
+
+    def _dead_letter(self, event: Any, target: Optional[str], packet: Optional[BasePacket],
+                     snapshot: tuple, error: Exception, attempts: int = 1) -> None:
+
+        self.metrics.inc('webhook_dead_letters_total', webhook=self.__name__,
+                         event=self.router.label(event), func=target or '')
+
+        if self.dead_letters is None:
+            self.logger.error(f"{self.__name__}: {target} failed {attempts} times ({error!r}) - dropped")
+            return None
+
+        path, headers, body = snapshot
+        letter_id = self.dead_letters.add(
+            self.__name__, event, target, packet.to_dict() if packet is not None else None,
+            path, headers, body, repr(error), attempts)
+        self.logger.error(f"{self.__name__}: {target or 'delivery'} failed {attempts} times "
+                          f"({error!r}) - dead letter {letter_id}")
+        return None
+
+    def replay_dead_letter(self, letter: DeadLetter) -> None:
+        """
+        Re-run a dead letter: its target alone with the stored packet, or the
+        whole pipeline for a delivery that failed to parse. Raises on failure.
+        """
+
+        with self.app.test_request_context(letter.path, method='POST', headers=letter.headers,
+                                           data=letter.body):
+            if letter.target is None:
+                # Parse here first, so a delivery that still fails raises
+                # rather than being dead-lettered again
+                self.receive()
+                return self.resolve()
+
+            target = self._find_target(letter.target)
+            if target is None:
+                raise Exception(f"{self.__name__}: no target named {letter.target} is registered")
+
+            packet = BasePacket.from_dict(letter.packet) if letter.packet is not None else None
+            self._run(letter.event, 'target', target, packet)
+
+        return None
+
+    def _find_target(self, name: str) -> Optional[Callable]:
+        """A registered target by qualified name, on the webhook or a tenant"""
+
+        routers = [self.router] + [tenant.router for tenant in self.tenants]
+        for router in routers:
+            for targets in router.targets.values():
+                for target in targets:
+                    if func_label(target) == name:
+                        return target
+
+        return None
+
+    def _sampled(self) -> ContextManager:
+        """Sampled cProfile capture, when a profiler is configured"""
+
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.sample(self.__name__)
+
+    def resolve(self) -> None:
+
+        self.logger.info("Thread started")
+        with self._sampled():
+            event, packet = self._receive()
+            self.dispatch(event, packet)
 
         self.logger.info("Thread closing")
         return None
@@ -200,34 +712,279 @@ class BaseWebhook(AbstractWebhook):
     def resolve_thread(self) -> Response:
         """Callback from Flask"""
 
+        status = '500'
+        start = time.perf_counter()
+        try:
+            response = self._respond()
+            status = str(response.status_code)
+            return response
+        finally:
+            self.metrics.inc('webhook_requests_total', webhook=self.__name__,
+                             status=status)
+            self.metrics.observe('webhook_request_seconds', time.perf_counter() - start,
+                                 webhook=self.__name__, status=status)
+
+    def precheck(self) -> Optional[Response]:
+        """
+        Answer requests no target can care about from the method and headers
+        alone, without reading the body: GET probes, empty bodies and event
+        types with no registered targets (including GitHub's ping).
+        """
+
+        chunked = 'chunked' in request.headers.get('Transfer-Encoding', '')
+
+        reason = None
+        if request.method != 'POST':
+            reason, response = 'probe', Response("OK", status=200)
+        elif not request.content_length and not chunked:
+            reason, response = 'empty', Response("Empty delivery", status=400)
+        elif self.event_header is not None:
+            event_type = request.headers.get(self.event_header, None)
+            if not (self.router.has_subscribers(event_type)
+                    or self.tenants.has_subscribers(event_type)):
+                reason, response = 'unsubscribed', Response("Event not subscribed", status=200)
+
+        if reason is None:
+            return None
+
+        self.metrics.inc('webhook_skipped_total', webhook=self.__name__, reason=reason)
+        self.logger.info(f'Skipped {reason} request - sending response: {response.status_code}')
+        return response
+
+    def _respond(self) -> Response:
+
+        hook = self.hooks.get(request.url_rule.rule, None)
+
+        skipped = self.precheck()
+        if skipped is not None:
+            # Captures keep the real load shape, skipped requests included
+            if hook is not None and hook.capture is not None:
+                self._capture(hook)
+            return skipped
+
+        try:
+            body = self._ingest(hook).body
+        except PayloadTooLarge:
+            self.metrics.inc('webhook_skipped_total', webhook=self.__name__, reason='too_large')
+            self.logger.warning(f'Oversized delivery on {request.path} - sending response: 413')
+            return Response("Payload too large", status=413)
+
+        if hook is not None and hook.capture is not None:
+            hook.capture.record(request.path, dict(request.headers), bytes(body), request.method)
+
+        if hook is not None and hook.secret:
+            signature = request.headers.get(self.signature_header, None)
+            if not verify_signature(hook.secret, body, signature):
+                self.logger.warning(f'Invalid signature on {request.path} - sending response: 401')
+                return Response("Invalid signature", status=401)
+
+        delivery_id = None
+        if self.dedupe is not None and self.delivery_header is not None:
+            delivery_id = request.headers.get(self.delivery_header, None)
+            if delivery_id and self.dedupe.seen(delivery_id):
+                self.logger.info(f'Duplicate delivery {delivery_id} - sending response: 200')
+                return Response("Duplicate delivery", status=200)
+
+        entry_id = None
+        if self.spool is not None:
+            if self.spool_only:
+                self.spool.append(request.path, dict(request.headers), body)
+                self.logger.info('Spooled delivery - sending response: 202')
+                return Response("Accepted for processing", status=202)
+
+            entry_id = self.spool.append(request.path, dict(request.headers), body,
+                                         claim=True)
+
+        if self.pool is None:
+            try:
+                self.resolve()
+            except Exception:
+                # The 500 hands the retry to the sender - let its redelivery
+                # through, and settle the spooled copy so the drain worker
+                # doesn't replay it as well
+                self._forget(delivery_id)
+                self._ack(entry_id)
+                raise
+            self._ack(entry_id)
+
+            self.logger.info('Sending response: 200')
+            return Response("This is final response", status=200)
+
+        try:
+            event, packet = self._receive()
+        except Exception:
+            self._forget(delivery_id)
+            self._ack(entry_id)
+            raise
+
+        # The body was read by _ingest and is cached with the delivery in the
+        # environ, so it survives the hand-over to a worker thread
         # https://stackoverflow.com/questions/50600886/flask-start-new-thread-runtimeerror-working-outside-of-request-context
-        # @copy_current_request_context
-        # def ctx_bridge():
-        #     self.resolve()
 
-        # gevent.spawn(ctx_bridge)
-        # thread = Thread(target=ctx_bridge)
-        # thread.start()
+        @copy_current_request_context
+        def ctx_bridge():
+            with self._sampled():
+                self.dispatch(event, packet)
+            self._ack(entry_id)
+            self.logger.info("Thread closing")
+
+        if not self.pool.submit(ctx_bridge):
+            # Hand the spooled copy over to the drain worker, if one is
+            # running - otherwise nothing holds the delivery, so let the
+            # sender's retry through
+            if entry_id is not None:
+                self.spool.release(entry_id)
+            else:
+                self._forget(delivery_id)
+
+            self.logger.info('Sending response: 503')
+            return Response("Queue is full, retry later", status=503,
+                            headers={'Retry-After': str(self.pool.retry_after)})
+
+        self.logger.info('Sending response: 202')
+        return Response("Accepted for processing", status=202)
+
+    def _capture(self, hook: Hook) -> None:
+        """Record a request that precheck answered, reading its body within the hook's limits"""
+
+        try:
+            body = bytes(self._ingest(hook).body)
+        except PayloadTooLarge:
+            return None
+
+        hook.capture.record(request.path, dict(request.headers), body, request.method)
+        return None
+
+    def _forget(self, delivery_id: Optional[str]) -> None:
+        """Unmark a delivery that was not accepted, so a redelivery is processed"""
+
+        if delivery_id:
+            self.dedupe.forget(delivery_id)
+
+    def _ingest(self, hook: Optional[Hook]) -> Delivery:
+        """
+        Read the body of the current request within the hook's size limits
+        and cache it as the request's Delivery
+        """
+
+        delivery = request.environ.get(Delivery.environ_key, None)
+        if delivery is not None:
+            return delivery
+
+        limit = hook.max_size if hook is not None and hook.max_size else self.max_size
+        threshold = (hook.stream_threshold if hook is not None and hook.stream_threshold
+                     else self.stream_threshold)
+
+        length = request.content_length
+        if limit is not None and length is not None and length > limit:
+            raise PayloadTooLarge(f"Body is over {limit} bytes")
+
+        if length is not None and length <= threshold:
+            return self.delivery
+
+        delivery = Delivery.ingest(request.headers, request.stream, self.codec,
+                                   threshold=threshold, limit=limit)
+        request.environ[Delivery.environ_key] = delivery
+        return delivery
+
+    def replay(self, path: str, headers: dict, body: bytes) -> None:
+        """Run a raw delivery through resolve outside of a live request"""
+
+        with self.app.test_request_context(path, method='POST', headers=headers,
+                                           data=body):
+            self.resolve()
+
+        return None
 
-        self.resolve()
+    def drain(self, poll: float = 1.0, max_attempts: int = 5,
+              once: bool = False, backoff: float = 2.0, max_backoff: float = 300.0) -> int:
+        """
+        Dispatch deliveries from the spool until interrupted, or until no
+        entry is due when once=True. Returns the number of entries handled.
+
+        A failed entry is retried after backoff * 2 ** (attempts - 1)
+        seconds, capped at max_backoff, and marked failed after max_attempts.
+        """
 
-        self.logger.info('Sending response: 200')
-        return Response("This is final response", status=200)
+        if self.spool is None:
+            raise Exception(f"{self.__name__}: no spool configured")
+
+        handled = 0
+        while True:
+            entry = self.spool.claim()
+            if entry is None:
+                if once:
+                    return handled
+                time.sleep(poll)
+                continue
+
+            try:
+                self.replay(entry.path, entry.headers, entry.body)
+            except Exception:
+                self.logger.exception(
+                    f"{self.__name__}: failed to replay delivery {entry.id} (attempt {entry.attempts})")
+                if entry.attempts < max_attempts:
+                    self.spool.release(entry.id, delay=min(max_backoff,
+                                                           backoff * 2 ** (entry.attempts - 1)))
+                    continue
+                self.logger.error(
+                    f"{self.__name__}: giving up on delivery {entry.id}")
+                self.spool.fail(entry.id)
+                handled += 1
+                continue
+
+            self.spool.ack(entry.id)
+            handled += 1
+
+    def _ack(self, entry_id: Optional[int]) -> None:
+
+        if entry_id is not None:
+            self.spool.ack(entry_id)
+
+    def register(self, event: str = None, function: Union[Callable, list] = [],
+                 concurrent: bool = False, after: Union[Callable, list] = (),
+                 fields: list = ()) -> None:
+        """
+        Register a downstream function. Events must either be listed in
+        `events` or be a wildcard pattern such as ('pull_request', '*')
+
+        With concurrent=True the function runs on the executor alongside the
+        other concurrent targets of the event, after any targets listed in
+        `after` (which must be registered first). Closers run once every
+        target has finished.
 
-    def register(self, event: str = None, function: Union[Callable, list] = []) -> None:
-        """Register a downstream function"""
+        `fields` lists the payload paths the function reads through
+        self.delivery.get. Receivers that project large payloads, such as
+        JiraWebhook, extract only these paths.
+        """
 
-        if event not in self.targets.keys():
+        if event not in self.targets.keys() and not EventRouter.is_pattern(event):
             raise Exception()
 
         if isinstance(function, Callable):
             function = [function]
+        if isinstance(after, Callable):
+            after = [after]
+
+        if concurrent and self.executor is None:
+            self.executor = ThreadExecutor()
 
         for func in function:
-            self.targets[event].append(func)
+            self.router.add_target(event, func, concurrent=concurrent, after=after,
+                                   fields=fields)
 
         return None
 
     def parse(self, request: Request = None) -> BasePacket:
 
         return None, None
+
+    def parser_key(self, event: Any) -> Any:
+        """Key into the parsers table for an event"""
+
+        return event
+
+    def _parsers(self) -> dict:
+        """Parsers by parser_key, built once when the router is created"""
+
+        return {}
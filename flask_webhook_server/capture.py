@@ -0,0 +1,160 @@
+import atexit
+import base64
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from threading import Lock, Thread
+from typing import Iterable, Iterator, Optional
+
+import requests
+
+
+class CaptureLog(object):
+    """
+    Rotating JSON-lines log of raw deliveries - one record per line with the
+    receive time, method, path, headers and body. Records are buffered in memory and
+    written in batches of `buffer_size`, or every `flush_interval` seconds.
+    """
+
+    def __init__(self,
+                 directory: str = './captures',
+                 max_bytes: int = 50 * 1024 * 1024,
+                 buffer_size: int = 64,
+                 flush_interval: float = 1.0
+                 ) -> None:
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+
+        self._buffer: list = []
+        self._files = count(1)
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self._path = self._new_path()
+
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.flush)
+
+        self._thread = Thread(target=self._run, name="capture-flush", daemon=True)
+        self._thread.start()
+
+    def record(self, path: str, headers: dict, body: bytes, method: str = 'POST') -> None:
+        """Buffer one delivery"""
+
+        entry = {'ts': time.time(), 'method': method, 'path': path, 'headers': headers}
+        try:
+            entry['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body'] = base64.b64encode(body).decode('ascii')
+            entry['encoding'] = 'base64'
+
+        line = json.dumps(entry, separators=(',', ':'))
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.buffer_size
+
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered records, rotating the file once it passes max_bytes"""
+
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+
+        if not lines:
+            return None
+
+        with self._write_lock:
+            with open(self._path, 'a') as handle:
+                handle.write('\n'.join(lines) + '\n')
+                size = handle.tell()
+
+            if size >= self.max_bytes:
+                self._path = self._new_path()
+
+        return None
+
+    def _new_path(self) -> str:
+        return os.path.join(self.directory,
+                            f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._files)}.jsonl")
+
+    def _run(self) -> None:
+
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def read_captures(paths: Iterable[str]) -> Iterator[dict]:
+    """Yield captured records from files or glob patterns, oldest file first"""
+
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(path)) if any(c in path for c in '*?[') else [path])
+
+    for path in files:
+        with open(path) as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def record_body(entry: dict) -> bytes:
+
+    if entry.get('encoding') == 'base64':
+        return base64.b64decode(entry['body'])
+    return entry['body'].encode('utf-8')
+
+
+def replay(entries: Iterable[dict],
+           base_url: str,
+           speed: float = 1.0,
+           concurrency: int = 1,
+           session: Optional[requests.Session] = None
+           ) -> dict:
+    """
+    Re-send captured deliveries to a running server.
+
+    speed=1 keeps the captured spacing between deliveries, speed=N plays N
+    times faster and speed=0 sends as fast as `concurrency` allows. Returns
+    a count of responses by status code.
+    """
+
+    session = session or requests.Session()
+    statuses: dict = {}
+    lock = Lock()
+
+    def send(entry: dict) -> None:
+        headers = dict((k, v) for k, v in entry['headers'].items()
+                       if k.lower() not in ('host', 'content-length'))
+        try:
+            # Records written before methods were captured are all POSTs
+            status = str(session.request(entry.get('method', 'POST'),
+                                         base_url.rstrip('/') + entry['path'],
+                                         data=record_body(entry), headers=headers).status_code)
+        except requests.RequestException:
+            status = 'error'
+
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    first_ts = None
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        for entry in entries:
+            if speed > 0:
+                if first_ts is None:
+                    first_ts = entry['ts']
+                delay = (entry['ts'] - first_ts) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(send, entry)
+
+    return statuses
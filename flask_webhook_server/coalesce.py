@@ -0,0 +1,135 @@
+import atexit
+import time
+from threading import Lock, Timer
+from typing import Any, Callable, Hashable
+from logging import Logger
+
+
+class Burst(object):
+    """Events held for one key while its quiet window is open"""
+
+    __slots__ = ('events', 'packets', 'callback', 'settlers', 'first', 'timer')
+
+    def __init__(self, callback: Callable, first: float) -> None:
+
+        self.events: list = []
+        self.packets: list = []
+        self.callback = callback
+        self.settlers: list = []
+        self.first = first
+        self.timer = None
+
+
+class Coalescer(object):
+    """
+    Debounces bursts of events that share a key, e.g. the opened, assigned
+    and review_requested deliveries GitHub sends for one pull request.
+
+    Each `submit` (re)starts a quiet window of `window` seconds for its key.
+    When the window closes without another submit, or `max_wait` seconds
+    after the first event of the burst, the callback of the latest submit is
+    called once with every event of the burst and the merged packet. Then
+    the `settle` callable of every submit in the burst is called, in order.
+
+    Bursts live in memory only and are flushed at interpreter exit.
+    """
+
+    def __init__(self, logger: Logger, window: float = 5.0, max_wait: float = 30.0,
+                 merge: Callable = None) -> None:
+
+        self.logger = logger
+        self.window = window
+        self.max_wait = max_wait
+        self.merge = merge or merge_packets
+
+        self._pending: dict = {}
+        self._lock = Lock()
+
+        atexit.register(self.flush)
+
+    def submit(self, key: Hashable, event: Any, packet: Any, callback: Callable,
+               settle: Callable = None) -> bool:
+        """
+        Hold an event until its burst settles. Returns True if the event
+        joined a burst that was already waiting.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            burst = self._pending.get(key, None)
+            joined = burst is not None
+            if burst is None:
+                burst = self._pending[key] = Burst(callback, now)
+            elif burst.timer is not None:
+                burst.timer.cancel()
+
+            burst.events.append(event)
+            burst.packets.append(packet)
+            burst.callback = callback
+            if settle is not None:
+                burst.settlers.append(settle)
+
+            delay = max(0.0, min(self.window, burst.first + self.max_wait - now))
+            burst.timer = Timer(delay, self._fire, args=(key, burst))
+            burst.timer.daemon = True
+            burst.timer.start()
+
+        return joined
+
+    def flush(self) -> int:
+        """Fire every waiting burst now, returning the number fired"""
+
+        with self._lock:
+            pending = list(self._pending.items())
+
+        for key, burst in pending:
+            if burst.timer is not None:
+                burst.timer.cancel()
+            self._fire(key, burst)
+
+        return len(pending)
+
+    def _fire(self, key: Hashable, burst: Burst) -> None:
+
+        with self._lock:
+            # A newer submit may have replaced the timer, or flush got here first
+            if self._pending.get(key, None) is not burst:
+                return
+            del self._pending[key]
+
+        try:
+            burst.callback(burst.events, self.merge(burst.packets))
+        except Exception:
+            self.logger.exception(f"Coalescer: failed to dispatch burst {key}")
+
+        for settle in burst.settlers:
+            try:
+                settle()
+            except Exception:
+                self.logger.exception(f"Coalescer: failed to settle burst {key}")
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+def merge_packets(packets: list) -> Any:
+    """
+    Merge a burst into its final state: scalar fields come from the last
+    packet, list fields are the ordered union across the burst
+    """
+
+    packets = [packet for packet in packets if packet is not None]
+    if not packets:
+        return None
+
+    merged = packets[-1].to_dict()
+    for field, value in merged.items():
+        if isinstance(value, list):
+            union: list = []
+            for packet in packets:
+                for item in getattr(packet, field) or []:
+                    if item not in union:
+                        union.append(item)
+            merged[field] = union
+
+    return type(packets[-1]).from_dict(merged)
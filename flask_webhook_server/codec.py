@@ -0,0 +1,45 @@
+import json
+from collections import namedtuple
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+Codec = namedtuple('Codec', ['name', 'loads', 'dumps'])
+"""A JSON codec - loads accepts bytes, dumps returns bytes"""
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _ujson_dumps(obj) -> bytes:
+    return ujson.dumps(obj).encode('utf-8')
+
+
+CODECS: dict = {'json': Codec('json', json.loads, _json_dumps)}
+
+if ujson is not None:
+    CODECS['ujson'] = Codec('ujson', ujson.loads, _ujson_dumps)
+
+if orjson is not None:
+    CODECS['orjson'] = Codec('orjson', orjson.loads, orjson.dumps)
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """Look up a codec by name, or the fastest one installed"""
+
+    if name is not None:
+        return CODECS[name]
+
+    for name in ('orjson', 'ujson', 'json'):
+        if name in CODECS:
+            return CODECS[name]
@@ -0,0 +1,100 @@
+import json
+import sqlite3
+import time
+from collections import namedtuple
+from threading import Lock
+from typing import Any, List, Optional
+
+DeadLetter = namedtuple('DeadLetter', ['id', 'created', 'webhook', 'event', 'target',
+                                       'packet', 'path', 'headers', 'body', 'error',
+                                       'attempts'])
+
+
+class DeadLetterStore(object):
+    """
+    Targets that kept failing, kept on disk in SQLite for inspection and
+    replay (see deadletters.py).
+
+    Each letter holds the event, the target's qualified name, the packet as
+    a dict and the raw delivery, so it can be re-run either against the
+    target alone or through the full pipeline. A letter with no target is a
+    delivery that could not be parsed.
+    """
+
+    def __init__(self, path: str = './deadletter.db') -> None:
+
+        self.path = path
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS letters ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created REAL NOT NULL,"
+            " webhook TEXT NOT NULL,"
+            " event TEXT,"
+            " target TEXT,"
+            " packet TEXT,"
+            " path TEXT,"
+            " headers TEXT,"
+            " body BLOB,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 1)")
+
+    def add(self, webhook: str, event: Any, target: Optional[str], packet: Optional[dict],
+            path: str, headers: dict, body: bytes, error: str, attempts: int = 1) -> int:
+        """Record a failure and return the letter's id"""
+
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO letters (created, webhook, event, target, packet, path, headers,"
+                " body, error, attempts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), webhook, json.dumps(event), target,
+                 json.dumps(packet) if packet is not None else None,
+                 path, json.dumps(headers), body, error, attempts))
+
+        return cur.lastrowid
+
+    def list(self, limit: int = 100) -> List[DeadLetter]:
+        """Oldest letters first"""
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM letters ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+        return [self._letter(row) for row in rows]
+
+    def get(self, letter_id: int) -> Optional[DeadLetter]:
+
+        with self._lock:
+            row = self._db.execute("SELECT * FROM letters WHERE id = ?", (letter_id,)).fetchone()
+
+        return self._letter(row) if row is not None else None
+
+    def remove(self, letter_id: int) -> None:
+
+        with self._lock:
+            self._db.execute("DELETE FROM letters WHERE id = ?", (letter_id,))
+
+    def __len__(self) -> int:
+
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM letters").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+    @staticmethod
+    def _letter(row: tuple) -> DeadLetter:
+
+        (letter_id, created, webhook, event, target, packet, path, headers, body,
+         error, attempts) = row
+        event = json.loads(event) if event is not None else None
+        if isinstance(event, list):
+            event = tuple(event)
+
+        return DeadLetter(letter_id, created, webhook, event, target,
+                          json.loads(packet) if packet is not None else None,
+                          path, json.loads(headers) if headers else {},
+                          bytes(body) if body is not None else b"", error, attempts)
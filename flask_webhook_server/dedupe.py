@@ -0,0 +1,82 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+
+class DeliveryCache(object):
+    """
+    TTL-bounded LRU of delivery ids, used to drop redelivered webhooks.
+
+    With `path` set, ids are also recorded in a SQLite file so every gunicorn
+    worker on the host sees each other's deliveries. The in-memory LRU is
+    checked first, so the file is only read for ids this process hasn't seen.
+    """
+
+    def __init__(self, ttl: float = 3600, maxsize: int = 10000,
+                 path: Optional[str] = None) -> None:
+
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.prune_interval = 60
+        self._pruned = 0.0
+        self._seen: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, timeout=10, isolation_level=None,
+                                       check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS deliveries (id TEXT PRIMARY KEY, expires REAL NOT NULL)")
+
+    def seen(self, delivery_id: str) -> bool:
+        """
+        Record a delivery id, returning True if it was already recorded and
+        has not expired.
+        """
+
+        now = time.time()
+        with self._lock:
+            expires = self._seen.get(delivery_id, None)
+            if expires is not None and expires > now:
+                self._seen.move_to_end(delivery_id)
+                return True
+
+            self._seen[delivery_id] = now + self.ttl
+            self._seen.move_to_end(delivery_id)
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+
+            if self._db is not None:
+                return self._seen_shared(delivery_id, now)
+
+        return False
+
+    def forget(self, delivery_id: str) -> None:
+        """Remove a delivery id, e.g. when its dispatch failed"""
+
+        with self._lock:
+            self._seen.pop(delivery_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM deliveries WHERE id = ?", (delivery_id,))
+
+    def _seen_shared(self, delivery_id: str, now: float) -> bool:
+
+        # Insert-or-ignore is atomic across processes; an existing row means
+        # another worker got there first. Expired rows are replaced, and pruned
+        # in bulk periodically
+        self._db.execute("DELETE FROM deliveries WHERE id = ? AND expires < ?",
+                         (delivery_id, now))
+
+        if now - self._pruned > self.prune_interval:
+            self._db.execute("DELETE FROM deliveries WHERE expires < ?", (now,))
+            self._pruned = now
+
+        cur = self._db.execute(
+            "INSERT OR IGNORE INTO deliveries (id, expires) VALUES (?, ?)",
+            (delivery_id, now + self.ttl))
+
+        return cur.rowcount == 0
@@ -0,0 +1,113 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Tuple
+
+try:
+    import gevent
+    import gevent.pool
+except ImportError:
+    gevent = None
+
+Outcome = namedtuple('Outcome', ['value', 'error'])
+
+
+class Executor(object):
+    """
+    Runs one stage of concurrent targets and waits for all of them.
+
+    `run` takes a list of (func, args) calls and returns an Outcome per call,
+    in the same order, once every call has finished. Exceptions are returned
+    rather than raised so the caller can account for each target.
+
+    `shares_context` is False when calls leave the process, in which case
+    targets only receive their packet - `BaseWebhook.delivery` and the
+    request context are not available to them.
+    """
+
+    shares_context: bool = True
+
+    def run(self, calls: List[Tuple[Callable, tuple]]) -> List[Outcome]:
+
+        outcomes = []
+        for func, args in calls:
+            try:
+                outcomes.append(Outcome(func(*args), None))
+            except Exception as err:
+                outcomes.append(Outcome(None, err))
+
+        return outcomes
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ThreadExecutor(Executor):
+    """Runs each stage on a shared thread pool"""
+
+    def __init__(self, max_workers: int = 8) -> None:
+
+        self.pool = ThreadPoolExecutor(max_workers=max_workers,
+                                       thread_name_prefix="webhook-target")
+
+    def run(self, calls: List[Tuple[Callable, tuple]]) -> List[Outcome]:
+
+        futures = [self.pool.submit(func, *args) for func, args in calls]
+        return [_outcome(future) for future in futures]
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+class GeventExecutor(Executor):
+    """
+    Runs each stage on a gevent pool. Only useful when blocking I/O is
+    cooperative, i.e. under `gevent.monkey.patch_all()` or gunicorn's gevent
+    worker class.
+    """
+
+    def __init__(self, size: int = 100) -> None:
+
+        if gevent is None:
+            raise ImportError("GeventExecutor requires gevent")
+
+        self.pool = gevent.pool.Pool(size)
+
+    def run(self, calls: List[Tuple[Callable, tuple]]) -> List[Outcome]:
+
+        greenlets = [self.pool.spawn(func, *args) for func, args in calls]
+        gevent.joinall(greenlets)
+
+        return [Outcome(g.value, None) if g.successful() else Outcome(None, g.exception)
+                for g in greenlets]
+
+    def shutdown(self) -> None:
+        self.pool.join()
+
+
+class ProcessExecutor(Executor):
+    """
+    Runs each stage on a process pool, for CPU-bound targets. Targets and
+    packets must be picklable.
+    """
+
+    shares_context: bool = False
+
+    def __init__(self, max_workers: int = None) -> None:
+
+        self.pool = ProcessPoolExecutor(max_workers=max_workers)
+
+    def run(self, calls: List[Tuple[Callable, tuple]]) -> List[Outcome]:
+
+        futures = [self.pool.submit(func, *args) for func, args in calls]
+        return [_outcome(future) for future in futures]
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+def _outcome(future: Any) -> Outcome:
+
+    try:
+        return Outcome(future.result(), None)
+    except Exception as err:
+        return Outcome(None, err)
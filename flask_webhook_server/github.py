@@ -1,10 +1,15 @@
-from typing import Callable
+from typing import Tuple, Any
 from .base import BasePacket, BaseWebhook
-from flask import Flask, request, Response
+from .mapping import PacketMapping
+from flask import Flask
 from logging import Logger
 
 
-class GithubWebhook(BaseWebhook):
+class GithubParser(object):
+    """
+    GitHub event names and payload parsers, shared by the Flask and asyncio
+    receivers. Relies on the receiver's `router`, `logger` and `delivery`.
+    """
 
     events: list = [
         None,
@@ -15,82 +20,109 @@ class GithubWebhook(BaseWebhook):
         ('pull_request', 'reopened'),
         ('pull_request', 'assigned'),
         ('pull_request', 'unassigned'),
+        ('issues', 'opened'),
+        ('issues', 'assigned'),
+        ('issue_comment', 'created'),
     ]
 
-    def __init__(self, app: Flask, logger: Logger):
-        super().__init__(app=app, logger=logger)
+    delivery_header = 'X-GitHub-Delivery'
+    signature_header = 'X-Hub-Signature-256'
+    event_header = 'X-GitHub-Event'
 
     def parse(self, event_type: str) -> BasePacket:
 
-        parsers = {
-            None: lambda x: x,
-            'star': self._parse_star,
-            'pull_request': self._parse_pull_request,
-        }
-
-        if event_type not in parsers.keys():
+        parser = self.router.parsers.get(event_type, None)
+        if parser is None:
             return None
 
-        return parsers[event_type]()
+        return parser(self.delivery)
+
+    def parser_key(self, event: Any) -> Any:
 
-    def resolve(self) -> None:
+        if isinstance(event, tuple):
+            return event[0]
+        return event
 
-        self.logger.info("Thread started")
+    # Packets for each event type - see PacketMapping
+    mappings: dict = {
+        'star': PacketMapping({
+            'name': "{@X-Github-Event} {action} for {repository.name}",
+            'tags': ['github'],
+            'priority': "1",
+        }),
+        'pull_request': PacketMapping({
+            'name': "Review {repository.name} PR {number} - {sender.login}",
+            'url': "{pull_request.url}",
+            'tags': ['github'],
+            'priority': "1",
+        }),
+        'issues': PacketMapping({
+            'name': "{repository.name} issue {issue.number} - {issue.title}",
+            'url': "{issue.html_url}",
+            'tags': ['github'],
+            'priority': "2",
+        }),
+        'issue_comment': PacketMapping({
+            'name': "Reply to {comment.user.login} on {repository.name} #{issue.number}",
+            'url': "{comment.html_url}",
+            'tags': ['github'],
+            'priority': "2",
+        }),
+    }
 
-        try:
-            event = self.get_event_name()
-            self.logger.info(f'Received event: {event}')
-        except:
-            print(request.json)
+    def _parsers(self) -> dict:
 
-        packet = self.parse(event[0])
-        if event not in self.targets.keys():
-            return None
+        return dict(self.mappings)
 
-        for target in self.targets[event]:
-            target(packet)
+    def receive(self) -> Tuple[Any, BasePacket]:
 
-        for closer in self.closers[event]:
-            closer()
+        event = self.get_event_name()
+        self.logger.info(f'Received event: {event}')
 
-        self.logger.info("Thread closing")
-        return None
+        route = self.route(event)
+        if route is None or route.parser is None:
+            return event, None
 
-    def get_event_name(self):
+        delivery = self.delivery
+        if route.fields:
+            delivery.project(route.fields)
 
-        event_type = request.headers.get('X-Github-Event', None)
-        # event_action = request.json.get('action', None)
-        event_action = request.json['action']
+        return event, route.parser(delivery)
 
-        return (event_type, event_action)
+    def tenant_keys(self) -> list:
 
-    def _parse_star(self) -> BasePacket:
+        fields = self.delivery.project(['repository.full_name', 'organization.login',
+                                        'installation.id'])
+        return [('repository', fields['repository.full_name']),
+                ('organization', fields['organization.login']),
+                ('installation', fields['installation.id'])]
 
-        head = request.headers
-        data = request.json
-        payload = {
-            'name': f"{head['X-Github-Event']} {data['action']} for {data['repository']['name']}",
-            # 'description_short': "",
-            # 'description_long': "",
-            # 'notes': [],
-            # 'url': "",
-            'tags': ['github'],
-            # 'location': "",
-            # 'people': [],
-            'priority': "1"
-        }
+    def coalesce_key(self, event: Any) -> Any:
+        """Pull request events are coalesced per repository and PR number"""
 
-        return BasePacket(**payload)
+        if not isinstance(event, tuple) or event[0] != 'pull_request':
+            return None
 
-    def _parse_pull_request(self) -> BasePacket:
+        fields = self.delivery.project(['repository.full_name', 'number'])
+        return (fields['repository.full_name'], fields['number'])
 
-        head = request.headers
-        data = request.json
-        payload = {
-            'name': f"Review {data['repository']['name']} PR {data['number']} - {data['sender']['login']}",
-            'url': f"{data['pull_request']['url']}",
-            'tags': ['github'],
-            'priority': "1"
-        }
+    def get_event_name(self):
+
+        delivery = self.delivery
+        event_type = delivery.header(self.event_header, None)
+
+        # Read the action and every field the event's mapping needs in one
+        # pass, which matters for large, streamed bodies
+        mapping = self.mappings.get(event_type, None)
+        paths = ['action'] + (mapping.paths if mapping is not None else [])
+        event_action = delivery.project(paths)['action']
+
+        return (event_type, event_action)
+
+
+class GithubWebhook(GithubParser, BaseWebhook):
+
+    __name__: str = "GithubWebhook"
 
-        return BasePacket(**payload)
+    def __init__(self, app: Flask, logger: Logger, **kwargs):
+        super().__init__(app=app, logger=logger, **kwargs)
@@ -0,0 +1,145 @@
+from typing import Any, Tuple
+from .base import BasePacket, BaseWebhook
+from .payload import Delivery
+from flask import Flask
+from logging import Logger
+
+
+class JiraWebhook(BaseWebhook):
+    """
+    Receiver for Jira issue and comment webhooks.
+
+    Jira bodies carry the whole issue, often with a changelog and rendered
+    fields, so only the paths the parsers and registered targets need are
+    extracted - see Delivery.project and the `fields` argument of register.
+    """
+
+    __name__: str = "JiraWebhook"
+    events: list = [
+        None,
+        ('issue', 'created'),
+        ('issue', 'updated'),
+        ('comment', 'created'),
+    ]
+
+    delivery_header = 'X-Atlassian-Webhook-Identifier'
+    signature_header = 'X-Hub-Signature'
+
+    # Paths read by each parser
+    projections: dict = {
+        'issue': (
+            'issue.key',
+            'issue.self',
+            'issue.fields.summary',
+            'issue.fields.priority.name',
+            'issue.fields.project.key',
+            'issue.fields.labels',
+            'issue.fields.assignee.displayName',
+        ),
+        'comment': (
+            'issue.key',
+            'issue.self',
+            'issue.fields.summary',
+            'issue.fields.project.key',
+            'comment.body',
+            'comment.author.displayName',
+        ),
+    }
+
+    priorities: dict = {
+        'Highest': '1',
+        'High': '1',
+        'Medium': '2',
+        'Low': '3',
+        'Lowest': '3',
+    }
+
+    def __init__(self, app: Flask, logger: Logger, **kwargs):
+        super().__init__(app=app, logger=logger, **kwargs)
+
+    def parser_key(self, event: Any) -> Any:
+
+        if isinstance(event, tuple):
+            return event[0]
+        return event
+
+    def _parsers(self) -> dict:
+
+        return {
+            'issue': self._parse_issue,
+            'comment': self._parse_comment,
+        }
+
+    def receive(self) -> Tuple[Any, BasePacket]:
+
+        event = self.get_event_name()
+        self.logger.info(f'Received event: {event}')
+
+        route = self.route(event)
+        if route is None or route.parser is None:
+            return event, None
+
+        delivery = self.delivery
+        delivery.project(self.projections.get(self.parser_key(event), ()) + route.fields)
+
+        return event, route.parser(delivery)
+
+    def tenant_keys(self) -> list:
+
+        key = self.delivery.project(['issue.fields.project.key'])['issue.fields.project.key']
+        return [('project', key)]
+
+    def get_event_name(self):
+        """('issue', 'created') from a webhookEvent of 'jira:issue_created'"""
+
+        name = self.delivery.project(['webhookEvent'])['webhookEvent'] or ""
+        name = name.split(':')[-1]
+
+        resource, _, action = name.rpartition('_')
+        if not resource:
+            return None
+
+        return (resource, action)
+
+    def _browse_url(self, delivery: Delivery) -> str:
+
+        api_url = delivery.get('issue.self') or ""
+        site = api_url.split('/rest/')[0]
+        if not site:
+            return ""
+
+        return f"{site}/browse/{delivery.get('issue.key')}"
+
+    def _tags(self, delivery: Delivery) -> list:
+
+        project = delivery.get('issue.fields.project.key')
+        return ['jira', project] if project else ['jira']
+
+    def _parse_issue(self, delivery: Delivery) -> BasePacket:
+
+        get = delivery.get
+        assignee = get('issue.fields.assignee.displayName')
+        payload = {
+            'name': f"{get('issue.key')} {get('issue.fields.summary')}",
+            'description_short': get('issue.fields.summary') or "",
+            'url': self._browse_url(delivery),
+            'tags': self._tags(delivery) + (get('issue.fields.labels') or []),
+            'people': [assignee] if assignee else [],
+            'priority': self.priorities.get(get('issue.fields.priority.name'), "")
+        }
+
+        return BasePacket(**payload)
+
+    def _parse_comment(self, delivery: Delivery) -> BasePacket:
+
+        get = delivery.get
+        author = get('comment.author.displayName')
+        payload = {
+            'name': f"Reply to {author} on {get('issue.key')} {get('issue.fields.summary')}",
+            'url': self._browse_url(delivery),
+            'notes': [get('comment.body')] if get('comment.body') else [],
+            'tags': self._tags(delivery),
+            'people': [author] if author else [],
+        }
+
+        return BasePacket(**payload)
@@ -0,0 +1,126 @@
+import time
+from threading import Lock
+from typing import Optional
+
+from .store import SharedState
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open"""
+    pass
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket - `rate` tokens per second, bursting up to
+    `capacity`.
+    """
+
+    def __init__(self, rate: float = 1.0, capacity: float = 1.0) -> None:
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a token, returning False if none arrives within timeout"""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def _take(self) -> float:
+        """Take a token if one is available, else return the wait for one"""
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+
+            return (1 - self._tokens) / self.rate
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a locked file, so that every process
+    on the host shares one limit - e.g. all gunicorn workers calling RTM.
+    """
+
+    def __init__(self, path: str, rate: float = 1.0, capacity: float = 1.0) -> None:
+        super().__init__(rate=rate, capacity=capacity)
+        self.state = SharedState(path)
+
+    def _take(self) -> float:
+
+        with self._lock, self.state.lock():
+            state = self.state.read()
+            now = time.time()
+            tokens = state.get('tokens', self.capacity)
+            tokens = min(self.capacity, tokens + (now - state.get('updated', now)) * self.rate)
+
+            if tokens >= 1:
+                self.state.update(tokens=tokens - 1, updated=now)
+                return 0.0
+
+            self.state.update(tokens=tokens, updated=now)
+            return (1 - tokens) / self.rate
+
+
+class CircuitBreaker(object):
+    """
+    Fails fast after `failure_threshold` consecutive failures. Once
+    `reset_timeout` seconds have passed a single trial call is let through;
+    success closes the circuit again, failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened = 0.0
+        self._lock = Lock()
+
+    def allow(self) -> bool:
+        """True if a call may go ahead"""
+
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self._opened >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def record_success(self) -> None:
+
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened = time.monotonic()
@@ -0,0 +1,121 @@
+from string import Formatter
+from typing import Any, Callable, Type
+
+from .base import BasePacket
+from .payload import Delivery
+
+_MISSING = object()
+
+
+class PacketMapping(object):
+    """
+    Declarative payload-to-packet mapping, compiled once into closures.
+
+    The spec maps BasePacket fields to templates:
+
+        PacketMapping({
+            'name': "Review {repository.name} PR {number} - {sender.login}",
+            'url': "{pull_request.url}",
+            'tags': ['github', '{repository.name}'],
+            'priority': "1",
+        })
+
+    `{dotted.path}` reads the body through Delivery.get and `{@Header-Name}`
+    reads a header. A template that is exactly one placeholder keeps the
+    value's type (e.g. a list); otherwise missing values format as "". Lists
+    map item by item. A callable receives the Delivery and returns the value.
+
+    Calling the mapping with a Delivery returns the packet. `paths` lists the
+    body paths read, for Delivery.project.
+    """
+
+    def __init__(self, spec: dict, packet_class: Type[BasePacket] = BasePacket) -> None:
+
+        unknown = set(spec) - set(packet_class._fields)
+        if unknown:
+            raise ValueError(f"Unknown packet fields in mapping: {sorted(unknown)}")
+
+        self.spec = spec
+        self.packet_class = packet_class
+        self.paths: list = []
+        self.headers: list = []
+
+        self._extractors = tuple((field, self._compile(template))
+                                 for field, template in spec.items())
+
+    def __call__(self, delivery: Delivery) -> BasePacket:
+
+        return self.packet_class(**dict([(field, extract(delivery))
+                                         for field, extract in self._extractors]))
+
+    def validate(self, body: bytes, headers: dict = None) -> BasePacket:
+        """
+        Map a sample payload, raising ValueError if it lacks any path or
+        header the mapping reads
+        """
+
+        delivery = Delivery(headers or {}, body)
+
+        missing = [path for path in self.paths if delivery.get(path, _MISSING) is _MISSING]
+        missing += [f"@{name}" for name in self.headers if delivery.header(name, None) is None]
+        if missing:
+            raise ValueError(f"Sample payload is missing {missing}")
+
+        return self(delivery)
+
+    def _compile(self, template: Any) -> Callable:
+
+        if callable(template):
+            return template
+
+        if isinstance(template, (list, tuple)):
+            items = [self._compile(item) for item in template]
+
+            def extract_list(delivery: Delivery) -> list:
+                values = []
+                for item in items:
+                    value = item(delivery)
+                    if isinstance(value, list):
+                        values.extend(value)
+                    elif value not in (None, ""):
+                        values.append(value)
+                return values
+
+            return extract_list
+
+        if not isinstance(template, str):
+            return lambda delivery: template
+
+        parts = [(literal, self._getter(name) if name is not None else None)
+                 for literal, name, _, _ in Formatter().parse(template)]
+
+        if len(parts) == 1 and parts[0][1] is None:
+            # Plain string
+            return lambda delivery: template
+
+        if len(parts) == 1 and not parts[0][0]:
+            # Exactly one placeholder - keep the value as is
+            return parts[0][1]
+
+        def extract(delivery: Delivery) -> str:
+            chunks = []
+            for literal, getter in parts:
+                chunks.append(literal)
+                if getter is not None:
+                    value = getter(delivery)
+                    chunks.append("" if value is None else str(value))
+            return ''.join(chunks)
+
+        return extract
+
+    def _getter(self, name: str) -> Callable:
+
+        if name.startswith('@'):
+            header = name[1:]
+            if header not in self.headers:
+                self.headers.append(header)
+            return lambda delivery: delivery.header(header, None)
+
+        if name not in self.paths:
+            self.paths.append(name)
+        return lambda delivery: delivery.get(name)
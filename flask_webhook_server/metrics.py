@@ -0,0 +1,182 @@
+import time
+import weakref
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock, local
+from typing import Any, Iterator
+
+from flask import Flask, Response
+
+DEFAULT_BUCKETS: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics(object):
+    """
+    Counters and latency histograms rendered in the Prometheus text format.
+
+    Every thread writes to its own shard, so recording a value takes no lock;
+    shards are only merged when the metrics are scraped. Shards of threads
+    (or greenlets) that have finished are folded into a single retired shard,
+    so short-lived timer threads don't grow the list without bound.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+
+        self.buckets = tuple(sorted(buckets))
+        self._local = local()
+        self._shards: list = []
+        self._lock = Lock()
+
+        self._retired: tuple = ({}, {})
+        self._owners: dict = {}
+        self._dead: deque = deque()
+
+    def inc(self, metric: str, value: float = 1, **labels: Any) -> None:
+        """Increment a counter"""
+
+        counters = self._shard()[0]
+        key = (metric, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, metric: str, value: float, **labels: Any) -> None:
+        """Record a value, in seconds, in a histogram"""
+
+        histograms = self._shard()[1]
+        key = (metric, tuple(sorted(labels.items())))
+        hist = histograms.get(key, None)
+        if hist is None:
+            # Per-bucket counts, then +Inf, sum and count
+            hist = histograms[key] = [0] * (len(self.buckets) + 3)
+
+        hist[bisect_left(self.buckets, value)] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+    @contextmanager
+    def time(self, metric: str, **labels: Any) -> Iterator[None]:
+        """Observe the wall time of a block"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(metric, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        """Merge every shard into Prometheus text exposition format"""
+
+        counters: dict = {}
+        histograms: dict = {}
+        with self._lock:
+            self._fold()
+            shards = list(self._shards)
+            _merge((counters, histograms), self._retired)
+
+        for shard in shards:
+            _merge((counters, histograms), shard)
+
+        lines = []
+        for metric in sorted(set(key[0] for key in counters)):
+            lines.append(f"# TYPE {metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{metric}{_labels(labels)} {value}")
+
+        for metric in sorted(set(key[0] for key in histograms)):
+            lines.append(f"# TYPE {metric} histogram")
+            for (name, labels), hist in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), hist[:-2]):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{metric}_sum{_labels(labels)} {hist[-2]}")
+                lines.append(f"{metric}_count{_labels(labels)} {hist[-1]}")
+
+        return '\n'.join(lines) + '\n'
+
+    def init_app(self, app: Flask, rule: str = '/metrics') -> None:
+        """Mount the scrape endpoint on a Flask app"""
+
+        def metrics_view() -> Response:
+            return Response(self.render(), status=200,
+                            mimetype='text/plain; version=0.0.4')
+
+        app.add_url_rule(rule=rule, endpoint='metrics', view_func=metrics_view,
+                         methods=['GET'])
+
+    def _shard(self) -> tuple:
+
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            # Thread-local storage is dropped when its thread ends, which
+            # collects the owner and queues the shard for folding. The
+            # callback may run mid-GC on any thread, so it only appends
+            owner = self._local.owner = _Owner()
+            dead = self._dead
+            with self._lock:
+                self._fold()
+                self._shards.append(shard)
+                self._owners[id(shard)] = weakref.ref(owner, lambda _: dead.append(shard))
+
+        return shard
+
+    def _fold(self) -> None:
+        """Merge the shards of finished threads into the retired shard - hold _lock"""
+
+        while self._dead:
+            shard = self._dead.popleft()
+            _merge(self._retired, shard)
+            self._owners.pop(id(shard), None)
+            self._shards = [live for live in self._shards if live is not shard]
+
+
+class _Owner(object):
+    """Weakly referenced marker kept in a thread's local storage"""
+
+    __slots__ = ('__weakref__',)
+
+
+def _merge(into: tuple, shard: tuple) -> None:
+
+    counters, histograms = into
+    for key, value in list(shard[0].items()):
+        counters[key] = counters.get(key, 0) + value
+    for key, hist in list(shard[1].items()):
+        merged = histograms.setdefault(key, [0] * len(hist))
+        for i, value in enumerate(list(hist)):
+            merged[i] += value
+
+
+def _labels(labels: tuple) -> str:
+
+    if not labels:
+        return ''
+
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+
+    return '{' + ','.join(pairs) + '}'
+
+
+def event_label(event: Any) -> str:
+    """Render an event key such as ('pull_request', 'opened') as a label"""
+
+    if isinstance(event, tuple):
+        return '.'.join(str(part) for part in event)
+    return str(event)
+
+
+def func_label(func: Any) -> str:
+    """Name of a target or closer for use as a label"""
+
+    return getattr(func, '__qualname__', None) or repr(func)
+
+
+REGISTRY = Metrics()
+"""Default registry shared by webhooks and connectors"""
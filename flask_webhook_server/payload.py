@@ -0,0 +1,210 @@
+import io
+import mmap
+import tempfile
+import warnings
+from typing import Any, BinaryIO, Iterable, Optional
+
+from flask import request
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from .codec import Codec, get_codec
+
+_MISSING = object()
+
+
+class PayloadTooLarge(Exception):
+    """The request body is over the hook's max_size"""
+
+
+class Delivery(object):
+    """
+    A single webhook delivery - headers plus the raw body, decoded at most
+    once and only when a field is first read.
+
+    Fields are read with dotted paths, e.g. delivery.get('repository.name'),
+    and each path is resolved once per delivery.
+
+    For large bodies, `project` reads a set of paths straight off the raw
+    bytes with ijson, without materialising the document. Bodies read with
+    `ingest` may be a read-only mmap of a temporary file rather than bytes.
+    """
+
+    __slots__ = ('headers', 'body', 'codec', '_json', '_fields')
+
+    environ_key = 'flask_webhook_server.delivery'
+
+    # Smaller bodies are cheaper to decode in full than to stream
+    stream_threshold: int = 64 * 1024
+
+    def __init__(self, headers: Any, body: bytes, codec: Codec = None) -> None:
+
+        self.headers = headers
+        self.body = body
+        self.codec = codec or get_codec()
+        self._json: Any = _MISSING
+        self._fields: dict = {}
+
+    @classmethod
+    def current(cls, codec: Codec = None) -> 'Delivery':
+        """
+        The delivery for the active Flask request. It is cached in the WSGI
+        environ, so it survives copy_current_request_context.
+        """
+
+        delivery = request.environ.get(cls.environ_key, None)
+        if delivery is None:
+            delivery = cls(request.headers, request.get_data(cache=True), codec)
+            request.environ[cls.environ_key] = delivery
+
+        return delivery
+
+    @classmethod
+    def ingest(cls, headers: Any, stream: BinaryIO, codec: Codec = None,
+               threshold: int = 1024 * 1024, limit: Optional[int] = None,
+               chunk_size: int = 64 * 1024) -> 'Delivery':
+        """
+        Read a body from a stream in chunks. Up to `threshold` bytes are kept
+        in memory; anything larger goes to a temporary file which is then
+        memory-mapped, so its pages stay file-backed. Raises PayloadTooLarge
+        as soon as more than `limit` bytes have been read.
+        """
+
+        size = 0
+        with tempfile.SpooledTemporaryFile(max_size=threshold) as spooled:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if limit is not None and size > limit:
+                    raise PayloadTooLarge(f"Body is over {limit} bytes")
+                spooled.write(chunk)
+
+            if size <= threshold:
+                spooled.seek(0)
+                body = spooled.read()
+            else:
+                spooled.flush()
+                body = mmap.mmap(spooled.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(headers, body, codec)
+
+    @property
+    def json(self) -> Any:
+        """The decoded body"""
+
+        if self._json is _MISSING:
+            body = self.body
+            if isinstance(body, mmap.mmap):
+                body = body[:]
+            self._json = self.codec.loads(body) if body else None
+
+        return self._json
+
+    def get(self, path: str, default: Any = None) -> Any:
+        """Read a dotted path from the body, e.g. 'pull_request.url'"""
+
+        try:
+            value = self._fields[path]
+        except KeyError:
+            value = self._fields[path] = self._resolve(path)
+
+        return default if value is _MISSING else value
+
+    def project(self, paths: Iterable[str]) -> dict:
+        """
+        Resolve several dotted paths at once, returning {path: value} with
+        None for missing paths. Later `get` calls for these paths are served
+        from the projection.
+
+        Bodies over stream_threshold are streamed when ijson is installed, and
+        the stream stops as soon as every path has been found. Paths indexing
+        into arrays, e.g. 'commits.0.id', always use the full decode.
+        """
+
+        paths = list(dict.fromkeys(paths))
+        pending = [path for path in paths if path not in self._fields
+                   and not any(key.isdigit() for key in path.split('.'))]
+
+        if pending and self._json is _MISSING and len(self.body) >= self.stream_threshold:
+            if ijson is not None:
+                self._fields.update(_stream(self.body, pending))
+            else:
+                # Shown once per process by the default warnings filter
+                warnings.warn("ijson is not installed - large bodies are decoded in full",
+                              RuntimeWarning)
+
+        return dict([(path, self.get(path)) for path in paths])
+
+    def _resolve(self, path: str) -> Any:
+
+        value = self.json
+        for key in path.split('.'):
+            if isinstance(value, dict):
+                value = value.get(key, _MISSING)
+            elif isinstance(value, list):
+                try:
+                    value = value[int(key)]
+                except (ValueError, IndexError):
+                    return _MISSING
+            else:
+                return _MISSING
+
+            if value is _MISSING:
+                return _MISSING
+
+        return value
+
+    def __getitem__(self, key: str) -> Any:
+        return self.json[key]
+
+    def header(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.headers.get(name, default)
+
+
+def _stream(body: bytes, paths: list) -> dict:
+    """Pull dotted paths out of a JSON document in one streaming pass"""
+
+    wanted = set(paths)
+    found = dict([(path, _MISSING) for path in paths])
+    builders: dict = {}
+
+    if isinstance(body, mmap.mmap):
+        body.seek(0)
+        source = body
+    else:
+        source = io.BytesIO(body)
+
+    for prefix, event, value in ijson.parse(source, use_float=True):
+        # Feed every value being built, including nested wanted paths
+        for path, (builder, depth) in list(builders.items()):
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+
+            if depth:
+                builders[path] = (builder, depth)
+            else:
+                found[path] = builder.value
+                del builders[path]
+                wanted.discard(path)
+
+        if prefix in wanted and prefix not in builders and event != 'map_key':
+            if event in ('start_map', 'start_array'):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                builders[prefix] = (builder, 1)
+            elif not event.startswith('end_'):
+                found[prefix] = value
+                wanted.discard(prefix)
+
+        if not wanted:
+            break
+
+    return found
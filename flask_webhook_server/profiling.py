@@ -0,0 +1,161 @@
+import cProfile
+import hmac
+import itertools
+import os
+import sys
+import time
+import traceback
+import tracemalloc
+from contextlib import contextmanager
+from threading import Timer, get_ident
+from typing import Iterator, Optional
+from logging import Logger
+
+from flask import Flask, Response, request
+
+
+class Profiler(object):
+    """
+    Opt-in profiling for the dispatch path.
+
+    sample_rate  - capture a cProfile of 1 in every N deliveries (0 disables)
+    slow_target  - seconds after which a running target has its stack logged,
+                   followed by a timing breakdown of the delivery
+    keep         - number of files kept in `directory` before the oldest are
+                   removed
+
+    Tracemalloc snapshots are taken on demand through the endpoint mounted by
+    init_app: the first call starts tracing, later calls dump a snapshot and
+    return the top allocation sites. Tracing slows the whole process, so the
+    endpoint requires an 'Authorization: Bearer <token>' header.
+    """
+
+    def __init__(self,
+                 logger: Logger,
+                 directory: str = './profiles',
+                 sample_rate: int = 0,
+                 slow_target: Optional[float] = None,
+                 keep: int = 50
+                 ) -> None:
+
+        self.logger = logger
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_target = slow_target
+        self.keep = keep
+
+        self._counter = itertools.count(1)
+        self._files = itertools.count(1)
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def sample(self, label: str) -> Iterator[None]:
+        """Profile the block for 1 in every sample_rate calls"""
+
+        if not self.sample_rate or next(self._counter) % self.sample_rate:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            path = self._path(label, 'prof')
+            profile.dump_stats(path)
+            self.logger.info(f"Profiler: wrote {path}")
+            self._rotate()
+
+    @contextmanager
+    def watch(self, label: str) -> Iterator[None]:
+        """Log the stack of the current thread if the block overruns slow_target"""
+
+        if self.slow_target is None:
+            yield
+            return
+
+        timer = Timer(self.slow_target, self._log_stack, args=(label, get_ident()))
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        finally:
+            timer.cancel()
+
+    def report(self, label: str, timings: list) -> None:
+        """Log a timing breakdown if any stage overran slow_target"""
+
+        if self.slow_target is None or not timings:
+            return None
+
+        if max(elapsed for _, elapsed in timings) < self.slow_target:
+            return None
+
+        total = sum(elapsed for _, elapsed in timings)
+        breakdown = ', '.join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in timings)
+        self.logger.warning(f"Profiler: slow dispatch of {label} ({total * 1000:.1f}ms) - {breakdown}")
+        return None
+
+    def snapshot(self, limit: int = 25) -> str:
+        """Start tracemalloc, or dump a snapshot and summarise it"""
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            return "tracemalloc started - request again for a snapshot\n"
+
+        snapshot = tracemalloc.take_snapshot()
+        path = self._path('tracemalloc', 'snapshot')
+        snapshot.dump(path)
+        self._rotate()
+
+        stats = snapshot.statistics('lineno')[:limit]
+        return f"Snapshot written to {path}\n" + '\n'.join(str(stat) for stat in stats) + '\n'
+
+    def init_app(self, app: Flask, rule: str = '/debug/tracemalloc',
+                 token: Optional[str] = None) -> None:
+        """Mount the tracemalloc snapshot endpoint on a Flask app, behind a bearer token"""
+
+        if not token:
+            raise Exception("Profiler: the tracemalloc endpoint needs a token")
+
+        expected = f"Bearer {token}".encode('utf-8')
+
+        def tracemalloc_view() -> Response:
+            supplied = request.headers.get('Authorization', '').encode('utf-8')
+            if not hmac.compare_digest(supplied, expected):
+                self.logger.warning(f"Profiler: unauthorised request to {rule} - sending response: 401")
+                return Response("Unauthorised", status=401)
+
+            return Response(self.snapshot(), status=200, mimetype='text/plain')
+
+        app.add_url_rule(rule=rule, endpoint='tracemalloc', view_func=tracemalloc_view,
+                         methods=['GET'])
+
+    def _log_stack(self, label: str, thread_id: int) -> None:
+
+        frame = sys._current_frames().get(thread_id, None)
+        if frame is None:
+            return None
+
+        stack = ''.join(traceback.format_stack(frame))
+        self.logger.warning(
+            f"Profiler: {label} still running after {self.slow_target}s\n{stack}")
+        return None
+
+    def _path(self, label: str, extension: str) -> str:
+
+        safe = ''.join(c if c.isalnum() else '_' for c in label)
+        return os.path.join(self.directory,
+                            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._files)}-{safe}.{extension}")
+
+    def _rotate(self) -> None:
+
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        paths.sort(key=lambda path: os.path.getmtime(path))
+
+        for path in paths[:max(len(paths) - self.keep, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,82 @@
+import heapq
+import itertools
+import random
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable
+from logging import Logger
+
+
+class RetryPolicy(object):
+    """
+    Exponential backoff with full jitter: attempt n waits a random time
+    between 0 and min(cap, base * 2 ** (n - 1)) seconds.
+    """
+
+    def __init__(self, retries: int = 3, base: float = 1.0, cap: float = 60.0) -> None:
+
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+
+class RetryScheduler(object):
+    """
+    Runs retries off the request path. Jobs wait on a timer heap and are
+    handed to a small thread pool once due, so a slow retry does not hold
+    up the others.
+    """
+
+    def __init__(self, logger: Logger, policy: RetryPolicy = None, workers: int = 2) -> None:
+
+        self.logger = logger
+        self.policy = policy or RetryPolicy()
+
+        self._heap: list = []
+        self._order = itertools.count()
+        self._cond = Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook-retry")
+
+        self._thread = Thread(target=self._run, name="webhook-retry-timer", daemon=True)
+        self._thread.start()
+
+    def schedule(self, job: Callable, attempt: int) -> bool:
+        """
+        Run job after the backoff for `attempt` (1 for the first retry).
+        Returns False, without scheduling, once the policy is exhausted.
+        """
+
+        if attempt > self.policy.retries:
+            return False
+
+        due = monotonic() + self.policy.delay(attempt)
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._order), job))
+            self._cond.notify()
+
+        return True
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def _run(self) -> None:
+
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > monotonic():
+                    timeout = self._heap[0][0] - monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, job = heapq.heappop(self._heap)
+
+            self._pool.submit(self._call, job)
+
+    def _call(self, job: Callable) -> None:
+
+        try:
+            job()
+        except Exception:
+            self.logger.exception("RetryScheduler: retry failed")
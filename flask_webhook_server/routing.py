@@ -0,0 +1,291 @@
+from collections import namedtuple
+from typing import Any, Callable, Iterator, Optional
+
+from .metrics import event_label
+
+WILDCARD = '*'
+UNROUTED = 'unrouted'
+
+Route = namedtuple('Route', ['event', 'parser', 'targets', 'closers', 'stages', 'fields'])
+
+
+class EventRouter(object):
+    """
+    Compiled routing table for webhook events.
+
+    Targets and closers are registered against either a concrete event, e.g.
+    ('pull_request', 'opened'), or a pattern: ('pull_request', '*') matches
+    every pull_request action, ('*', 'opened') matches that action on any
+    event type and '*' (or ('*', '*')) matches everything.
+
+    Every concrete event known at registration time is compiled up front into
+    a frozen Route of (event, parser, targets, closers, stages, fields). Events
+    first seen at request time are compiled once and memoised, so routing a
+    delivery is a single dict lookup.
+
+    `stages` groups the targets for concurrent fan-out - see `plan`. `fields`
+    is the union of the payload paths the targets declared they read.
+    """
+
+    max_routes: int = 1024
+
+    def __init__(self, events: list, parsers: dict = None,
+                 parser_key: Callable = None) -> None:
+
+        self.targets: dict = dict([(evnt, []) for evnt in events])
+        self.closers: dict = dict([(evnt, []) for evnt in events])
+        self.parsers: dict = parsers or {}
+        self.parser_key: Callable = parser_key or (lambda event: event)
+        self.options: dict = {}
+        self.fields: dict = {}
+
+        self._table: dict = {}
+        self._subscribed: frozenset = frozenset()
+        self.compile()
+
+    @staticmethod
+    def is_pattern(event: Any) -> bool:
+        """True if event is a wildcard pattern rather than a concrete event"""
+
+        if isinstance(event, tuple):
+            # Only (type, action) pairs are matched - see patterns
+            return len(event) == 2 and WILDCARD in event
+        return event == WILDCARD
+
+    @staticmethod
+    def patterns(event: Any) -> tuple:
+        """Every registration key that can match a concrete event"""
+
+        if isinstance(event, tuple) and len(event) == 2:
+            return (event, (event[0], WILDCARD), (WILDCARD, event[1]),
+                    (WILDCARD, WILDCARD), WILDCARD)
+        return (event, WILDCARD)
+
+    def add_target(self, event: Any, func: Callable, concurrent: bool = False,
+                   after: tuple = (), fields: tuple = ()) -> None:
+
+        self.targets.setdefault(event, []).append(func)
+        self.options[(event, func)] = (concurrent, tuple(after))
+        self.fields.setdefault(event, []).extend(fields)
+        self.compile()
+
+    def add_closer(self, event: Any, func: Callable) -> None:
+
+        self.closers.setdefault(event, []).append(func)
+        self.compile()
+
+    def compile(self) -> None:
+        """Rebuild the routing table after a registration"""
+
+        table = {}
+        for event in self.targets.keys():
+            if not self.is_pattern(event):
+                table[event] = self._build(event)
+
+        self._table = table
+
+        # First element of every event key with targets, for has_subscribers
+        self._subscribed = frozenset(
+            event[0] if isinstance(event, tuple) else event
+            for event, targets in self.targets.items() if targets)
+
+    def has_subscribers(self, event_type: Any) -> bool:
+        """
+        True if any target could match an event of this type, e.g. 'star' for
+        ('star', 'created') - decidable before the body is read
+        """
+
+        return event_type in self._subscribed or WILDCARD in self._subscribed
+
+    def label(self, event: Any) -> str:
+        """
+        Metric label for an event: its name if it is declared or registered,
+        else the registration pattern it matched, else UNROUTED. Events come
+        from request bodies, so this keeps label cardinality bounded.
+        """
+
+        try:
+            for key in self.patterns(event):
+                if key in self.targets:
+                    return event_label(key)
+        except TypeError:
+            # Unhashable event, e.g. a list decoded from a payload
+            pass
+
+        return UNROUTED
+
+    def route(self, event: Any) -> Optional[Route]:
+        """Look up the compiled route for an event - None if nothing matches"""
+
+        try:
+            return self._table[event]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable event, e.g. a list decoded from a payload
+            return None
+
+        route = self._build(event)
+        if len(self._table) < self.max_routes:
+            self._table[event] = route
+
+        return route
+
+    def _build(self, event: Any) -> Optional[Route]:
+
+        patterns = [p for p in self.patterns(event) if p in self.targets]
+        if not patterns:
+            return None
+
+        targets = tuple(func for p in patterns for func in self.targets[p])
+        closers = tuple(func for p in self.patterns(event) if p in self.closers
+                        for func in self.closers[p])
+        parser = self.parsers.get(self.parser_key(event), None)
+
+        fields = tuple(dict.fromkeys(path for p in patterns
+                                     for path in self.fields.get(p, ())))
+
+        return Route(event, parser, targets, closers, self.plan(event, targets), fields)
+
+    def plan(self, event: Any, targets: tuple) -> tuple:
+        """
+        Group an event's targets into stages that run one after another.
+        Targets registered for the event with concurrent=True share a stage
+        with their concurrent neighbours, unless `after` names a target they
+        must wait for; any other target runs alone, after everything
+        registered before it. Options are per registration, so the same
+        function may be concurrent for one event and not another.
+        """
+
+        patterns = self.patterns(event)
+
+        stages: list = []
+        levels: dict = {}
+        floor = 0
+
+        for func in targets:
+            concurrent, after = next((self.options[(p, func)] for p in patterns
+                                      if (p, func) in self.options), (False, ()))
+            if concurrent:
+                level = max([floor] + [levels[dep] + 1 for dep in after if dep in levels])
+            else:
+                level = len(stages)
+                floor = level + 1
+
+            levels[func] = level
+            while len(stages) <= level:
+                stages.append([])
+            stages[level].append(func)
+
+        return tuple(tuple(stage) for stage in stages)
+
+
+class Tenant(object):
+    """
+    Registration handle for one tenant, e.g. a repository or an org - see
+    TenantTable. Mirrors the webhook's register, plus per-tenant closers.
+    """
+
+    def __init__(self, table: 'TenantTable', key: tuple, router: EventRouter) -> None:
+
+        self.table = table
+        self.key = key
+        self.router = router
+
+    def register(self, event: Any = None, function: Any = [], concurrent: bool = False,
+                 after: Any = (), fields: list = ()) -> 'Tenant':
+
+        if event not in self.router.targets.keys() and not EventRouter.is_pattern(event):
+            raise Exception()
+
+        if callable(function):
+            function = [function]
+        if callable(after):
+            after = [after]
+
+        for func in function:
+            self.router.add_target(event, func, concurrent=concurrent, after=after,
+                                   fields=fields)
+
+        self.table._subscribed.add(event[0] if isinstance(event, tuple) else event)
+        return self
+
+    def closer(self, func: Callable) -> Callable:
+        """Decorator - run func after every delivery for this tenant"""
+
+        self.router.add_closer(WILDCARD, func)
+        return func
+
+
+class TenantTable(object):
+    """
+    Per-tenant routers behind a single webhook route.
+
+    Tenants are keyed by (kind, value) tuples such as
+    ('repository', 'octo/app') or ('installation', '42'). Each has its own
+    EventRouter sharing the webhook's events and parsers, so registering
+    for one tenant only recompiles that tenant's table, and finding the
+    tenant for a delivery is one dict lookup per candidate key.
+    """
+
+    def __init__(self, events: list, parsers: dict = None,
+                 parser_key: Callable = None) -> None:
+
+        self.events = events
+        self.parsers = parsers
+        self.parser_key = parser_key
+
+        self._tenants: dict = {}
+        self._subscribed: set = set()
+
+    def tenant(self, kind: str, value: Any) -> Tenant:
+        """The tenant for a key, created on first use"""
+
+        key = (kind, str(value))
+        tenant = self._tenants.get(key, None)
+        if tenant is None:
+            router = EventRouter(self.events, parsers=self.parsers, parser_key=self.parser_key)
+            tenant = self._tenants[key] = Tenant(self, key, router)
+
+        return tenant
+
+    def lookup(self, keys: list) -> Optional[Tenant]:
+        """The first tenant matching a delivery's candidate keys"""
+
+        for kind, value in keys:
+            if value is None:
+                continue
+            tenant = self._tenants.get((kind, str(value)), None)
+            if tenant is not None:
+                return tenant
+
+        return None
+
+    def has_subscribers(self, event_type: Any) -> bool:
+
+        return event_type in self._subscribed or WILDCARD in self._subscribed
+
+    def route(self, route: Optional[Route], event: Any, keys: list) -> Optional[Route]:
+        """Merge the matching tenant's route for an event into the shared one"""
+
+        tenant = self.lookup(keys)
+        if tenant is None:
+            return route
+
+        extra = tenant.router.route(event)
+        if extra is None:
+            return route
+        if route is None:
+            return extra
+
+        return Route(event, route.parser or extra.parser,
+                     route.targets + extra.targets,
+                     route.closers + extra.closers,
+                     route.stages + extra.stages,
+                     tuple(dict.fromkeys(route.fields + extra.fields)))
+
+    def __iter__(self) -> Iterator[Tenant]:
+        return iter(list(self._tenants.values()))
+
+    def __len__(self) -> int:
+        return len(self._tenants)
@@ -1,15 +1,34 @@
 from flask_webhook_server.base import BasePacket
+import asyncio
 import os
-from typing import Optional, Union
+import weakref
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from threading import Event, Lock, Thread, local
+from typing import Callable, Optional, Union, Tuple
 import requests
 import dotenv
 import hashlib
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from flask import Flask, request
 from logging import Logger
 
 from requests.models import Response
 from . import BaseWebhook, AbstractConnector
+from .limits import CircuitBreaker, CircuitOpenError, TokenBucket
+from .metrics import Metrics, REGISTRY
+from .store import SharedState
+from .tasks import RtmTask, TaskIndex
 
 
 class RtmConnector(AbstractConnector):
@@ -19,7 +38,18 @@ class RtmConnector(AbstractConnector):
 
     _required_env = ["RTM_API_KEY", "RTM_API_SECRET"]
 
-    def __init__(self, logger: Logger, env_file: str = './.env') -> None:
+    def __init__(self,
+                 logger: Logger,
+                 env_file: str = './.env',
+                 pool_size: int = 10,
+                 timeout: Union[float, Tuple[float, float]] = (3.05, 10),
+                 retries: int = 3,
+                 backoff: float = 0.3,
+                 metrics: Metrics = None,
+                 base_url: Optional[str] = None,
+                 limiter: TokenBucket = None,
+                 breaker: CircuitBreaker = None
+                 ) -> None:
 
         for env in self._required_env:
             if env not in os.environ:
@@ -32,9 +62,22 @@ class RtmConnector(AbstractConnector):
         self.TOKEN = os.environ["RTM_API_TOKEN"]
 
         self.logger = logger
+        self.metrics = metrics or REGISTRY
+        self.BASE_URL = base_url or os.environ.get("RTM_BASE_URL", self.BASE_URL)
         self.env = env_file
         self.frob: str = ""
-        self.timeline: str = ""
+
+        # Timelines are kept per thread, falling back to the first timeline
+        # created by any thread
+        self._local = local()
+        self._shared_timeline: str = ""
+
+        self.timeout = timeout
+        self.session = self._create_session(pool_size, retries, backoff)
+
+        # RTM allows roughly one call per second per key
+        self.limiter = limiter
+        self.breaker = breaker
 
         self.BASE_HEADER = {
             "api_key": self.KEY,
@@ -51,8 +94,8 @@ class RtmConnector(AbstractConnector):
         }
         data.update({"api_sig": self._sign_request(data)})
 
-        r = requests.get(self.BASE_URL, params=data)
-        return (r.json() if json else r)
+        r = self._request(self.session.get, method, data)
+        return (self._json(method, r) if json else r)
 
     def post(self, method: str = None, params: dict = {}, json: bool = True) -> Union[Response, dict]:
         """docstring"""
@@ -64,8 +107,85 @@ class RtmConnector(AbstractConnector):
         }
         data.update({"api_sig": self._sign_request(data)})
 
-        r = requests.post(self.BASE_URL, params=data)
-        return (r.json() if json else r)
+        r = self._request(self.session.post, method, data)
+        return (self._json(method, r) if json else r)
+
+    def _request(self, send: Callable, method: str, data: dict) -> Response:
+        """
+        Send a signed request through the circuit breaker and rate limiter,
+        recording its latency and status
+        """
+
+        if self.breaker is not None and not self.breaker.allow():
+            self.metrics.inc('rtm_requests_total', method=method, status='circuit_open')
+            raise CircuitOpenError(f"RTM circuit is open - not calling {method}")
+
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            r = send(self.BASE_URL, params=data, timeout=self.timeout)
+            status = str(r.status_code)
+            return r
+        finally:
+            if self.breaker is not None:
+                if status == 'error' or status.startswith('5'):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+            self.metrics.inc('rtm_requests_total', method=method, status=status)
+            self.metrics.observe('rtm_request_seconds', time.perf_counter() - start,
+                                 method=method, status=status)
+
+    def _json(self, method: str, r: Response) -> dict:
+        """Decode a response, logging RTM-level failures"""
+
+        body = r.json()
+        rsp = body.get('rsp', {}) if isinstance(body, dict) else {}
+        if rsp.get('stat') == 'fail':
+            self.logger.warning(f"RTM - {method} failed: {rsp.get('err')}")
+
+        return body
+
+    @property
+    def timeline(self) -> str:
+        """Timeline of the current thread, or the shared default"""
+        return getattr(self._local, 'timeline', self._shared_timeline)
+
+    @timeline.setter
+    def timeline(self, value: str) -> None:
+        self._local.timeline = value
+        if not self._shared_timeline:
+            self._shared_timeline = value
+
+    def _create_session(self, pool_size: int, retries: int, backoff: float) -> requests.Session:
+        """
+        Pooled keep-alive session shared by every thread. Only connection
+        failures are retried for POST, since rtm.tasks.add is not idempotent.
+        """
+
+        retry = Retry(total=retries,
+                      connect=retries,
+                      read=retries,
+                      status=retries,
+                      backoff_factor=backoff,
+                      status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']))
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=retry)
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self) -> None:
+        """Release the pooled connections"""
+
+        self.session.close()
 
     def check_auth(self) -> Response:
         """docstring"""
@@ -129,6 +249,7 @@ class RtmConnector(AbstractConnector):
             raise Exception('Failed to get API token')
 
         self.TOKEN = rsp.json()['rsp']['auth']['token']
+        self.BASE_HEADER["auth_token"] = self.TOKEN
         self.update_dotenv()
 
         return success
@@ -180,38 +301,273 @@ class RtmApi(RtmConnector):
         'note': '//',
     }
 
-    def __init__(self, app: Flask, logger: Logger, env_file: str = './.env') -> None:
-        super().__init__(logger=logger, env_file=env_file)
-
-        rsp = self.check_auth()
-        if rsp.status_code != 200:
-            success = self.authenticate()
-        else:
-            self.logger.info('RTM - token is good!')
+    def __init__(self,
+                 app: Flask,
+                 logger: Logger,
+                 env_file: str = './.env',
+                 batch_window: float = 0.5,
+                 batch_size: int = 20,
+                 state_file: str = './.rtm_state.json',
+                 token_ttl: float = 3600,
+                 timeline_ttl: float = 43200,
+                 warmup: bool = False,
+                 deferred_size: int = 1000,
+                 deferred_interval: float = 10,
+                 task_index: TaskIndex = None,
+                 sync_interval: float = 300,
+                 **kwargs) -> None:
+        super().__init__(logger=logger, env_file=env_file, **kwargs)
+
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.batcher: Optional[RtmTaskBatcher] = None
+        self._batcher_lock = Lock()
+
+        # Auth checks and the default timeline are deferred to first use and
+        # cached in a state file shared by every worker - see ensure_ready
+        self.state = SharedState(state_file)
+        self.token_ttl = token_ttl
+        self.timeline_ttl = timeline_ttl
+        self._ready = False
+        self._ready_lock = Lock()
+
+        # Tasks that could not be sent while the circuit breaker was open,
+        # retried every deferred_interval by a background thread
+        self.deferred: deque = deque(maxlen=deferred_size)
+        self.deferred_interval = deferred_interval
+        self._deferred_thread: Optional[Thread] = None
+        self._deferred_lock = Lock()
+
+        # Local copy of the task list, used to skip tasks that already exist.
+        # Refreshed with an incremental getList at most every sync_interval
+        self.task_index = task_index
+        self.sync_interval = sync_interval
+        self._sync_lock = Lock()
+
+        if warmup:
+            Thread(target=self.ensure_ready, name="rtm-warmup", daemon=True).start()
+
+    def ensure_ready(self) -> None:
+        """
+        Check the token and pick up a timeline, once per process. Results are
+        shared through the state file, so only the first worker on a host
+        pays for the round-trips.
+        """
+
+        if self._ready:
+            return None
 
-        _ = self.create_timeline()
+        with self._ready_lock:
+            if self._ready:
+                return None
+
+            with self.state.lock():
+                state = self.state.read()
+                now = time.time()
+
+                # The cached token wins unless RTM_API_TOKEN has changed since
+                # it was cached, e.g. rotated in .env - then the new token is
+                # used and checked straight away
+                env_token = os.environ.get("RTM_API_TOKEN", "")
+                rotated = state.get('env_token', env_token) != env_token
+                if state.get('token') and not rotated:
+                    self.TOKEN = state['token']
+                    self.BASE_HEADER["auth_token"] = self.TOKEN
+                elif rotated:
+                    self.logger.info('RTM - RTM_API_TOKEN has changed, checking the new token')
+
+                if rotated or now - state.get('token_checked', 0) > self.token_ttl:
+                    rsp = self.check_auth()
+                    if rsp.status_code != 200:
+                        if not sys.stdin.isatty():
+                            raise Exception('RTM - token is invalid and cannot authenticate non-interactively')
+                        self.authenticate()
+                    else:
+                        self.logger.info('RTM - token is good!')
+                    state = self.state.update(token=self.TOKEN, token_checked=now,
+                                              env_token=env_token)
+
+                if state.get('timeline') and now - state.get('timeline_created', 0) < self.timeline_ttl:
+                    self._shared_timeline = state['timeline']
+                else:
+                    timeline = self.create_timeline()
+                    self._shared_timeline = timeline
+                    self.state.update(timeline=timeline, timeline_created=now)
+
+            self._ready = True
 
-    def get_tasks(self) -> None:
         return None
 
+    def sync_tasks(self, force: bool = False) -> int:
+        """
+        Bring the task index up to date with rtm.tasks.getList, asking only
+        for changes since the last sync. Returns the number of tasks changed.
+        """
+
+        if self.task_index is None:
+            return 0
+
+        with self._sync_lock:
+            if not force and time.time() - self.task_index.synced_at < self.sync_interval:
+                return 0
+
+            self.ensure_ready()
+
+            params = {}
+            if self.task_index.last_sync:
+                params["last_sync"] = self.task_index.last_sync
+
+            started = time.time()
+            rsp = self.get("rtm.tasks.getList", params)
+            if rsp.get('rsp', {}).get('stat') != 'ok':
+                return 0
+
+            changed = self.task_index.apply(rsp)
+            self.task_index.mark_synced(started)
+
+        if changed:
+            self.logger.info(f"RTM - synced {changed} changed tasks")
+        return changed
+
+    def get_tasks(self, **criteria) -> Optional[list]:
+        """
+        Open tasks from the local index, filtered by name, url or tags. None
+        without a task index.
+        """
+
+        if self.task_index is None:
+            return None
+
+        self.sync_tasks()
+        return self.task_index.find(**criteria)
+
+    def find_existing(self, packet: BasePacket) -> Optional[RtmTask]:
+        """An open task with the packet's URL or, failing that, its name"""
+
+        if self.task_index is None:
+            return None
+
+        try:
+            self.sync_tasks()
+        except Exception as err:
+            # A stale index is better than no task at all
+            self.logger.warning(f"RTM - task sync failed: {err}")
+
+        tasks = self.task_index.find(url=packet.url) if packet.url else []
+        if not tasks:
+            tasks = self.task_index.find(name=packet.name)
+        return tasks[0] if tasks else None
+
     def create_task(self, packet: BasePacket) -> Union[Response, dict]:
 
+        data = self.task_params(packet)
+
+        existing = self.find_existing(packet)
+        if existing is not None:
+            self.logger.info(f"Task already exists: {existing.name}")
+            return None
+
+        try:
+            self.ensure_ready()
+            req = self.post("rtm.tasks.add", data)
+        except CircuitOpenError:
+            self.defer(data)
+            return None
+
+        self.logger.info(f"Created new task: {data['name']}")
+        if self.task_index is not None:
+            self.task_index.apply(req)
+
+        return req
+
+    def defer(self, data: dict) -> None:
+        """Keep a task for retry_deferred, starting the retry thread if needed"""
+
+        self.deferred.append(data)
+        self.logger.warning(f"RTM unavailable - deferred task: {data['name']}")
+
+        with self._deferred_lock:
+            if self._deferred_thread is None or not self._deferred_thread.is_alive():
+                self._deferred_thread = Thread(target=self._drain_deferred,
+                                               name="rtm-deferred", daemon=True)
+                self._deferred_thread.start()
+
+    def retry_deferred(self) -> int:
+        """
+        Send tasks deferred while the circuit was open, oldest first. Stops at
+        the first CircuitOpenError; any other failure drops that task alone.
+        """
+
+        sent = 0
+        while self.deferred:
+            try:
+                data = self.deferred.popleft()
+            except IndexError:
+                break
+
+            try:
+                self.ensure_ready()
+                rsp = self.post("rtm.tasks.add", data)
+            except CircuitOpenError:
+                self.deferred.appendleft(data)
+                break
+            except Exception:
+                self.logger.exception(f"RTM - failed to send deferred task: {data['name']}")
+                continue
+
+            if self.task_index is not None:
+                self.task_index.apply(rsp)
+            sent += 1
+
+        if sent:
+            self.logger.info(f"Created {sent} deferred tasks")
+        return sent
+
+    def _drain_deferred(self) -> None:
+
+        while True:
+            time.sleep(self.deferred_interval)
+            self.retry_deferred()
+            with self._deferred_lock:
+                if not self.deferred:
+                    self._deferred_thread = None
+                    return None
+
+    def queue_task(self, packet: BasePacket) -> Future:
+        """
+        Batched variant of create_task, usable as a target. Returns a future
+        resolving to the rtm.tasks.add response.
+        """
+
+        existing = self.find_existing(packet)
+        if existing is not None:
+            self.logger.info(f"Task already exists: {existing.name}")
+            future: Future = Future()
+            future.set_result(None)
+            return future
+
+        if self.batcher is None:
+            with self._batcher_lock:
+                if self.batcher is None:
+                    self.batcher = RtmTaskBatcher(self, window=self.batch_window,
+                                                  max_size=self.batch_size)
+
+        return self.batcher.submit(packet)
+
+    def task_params(self, packet: BasePacket) -> dict:
+        """Build the rtm.tasks.add parameters for a packet"""
+
         assert packet.name
 
         task = {}
         for rtm_key, pkt_key in self.conversion.items():
             task[rtm_key] = getattr(packet, pkt_key, None)
 
-        data = {
+        return {
             "name": self.create_smart_string(task),
             "parse": "1"  # use smart string parser
         }
 
-        req = self.post("rtm.tasks.add", data)
-        self.logger.info(f"Created new task: {data['name']}")
-
-        return req
-
     def create_smart_string(self, data: dict) -> str:
 
         if data is None:
@@ -243,6 +599,263 @@ class RtmApi(RtmConnector):
         return None
 
 
+class RtmTaskBatcher(object):
+    """
+    Coalescing writer for rtm.tasks.add.
+
+    Packets are collected for up to `window` seconds, or until `max_size`
+    distinct tasks are waiting, then written in one pass on a dedicated
+    timeline. Packets producing the same smart string share a single call and
+    receive the same result.
+    """
+
+    def __init__(self, api: RtmApi, window: float = 0.5, max_size: int = 20) -> None:
+
+        self.api = api
+        self.window = window
+        self.max_size = max_size
+
+        self._pending: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self._full = Event()
+
+        self._thread = Thread(target=self._run, name="rtm-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, packet: BasePacket) -> Future:
+        """Queue a packet for the next flush"""
+
+        data = self.api.task_params(packet)
+        future: Future = Future()
+
+        with self._lock:
+            entry = self._pending.get(data["name"])
+            if entry is None:
+                self._pending[data["name"]] = (data, [future])
+            else:
+                entry[1].append(future)
+
+            if len(self._pending) >= self.max_size:
+                self._full.set()
+
+        return future
+
+    def flush(self) -> int:
+        """Write every pending task, returning the number created"""
+
+        with self._lock:
+            batch = self._pending
+            self._pending = OrderedDict()
+
+        if not batch:
+            return 0
+
+        items = list(batch.items())
+        try:
+            self.api.ensure_ready()
+            # The batcher thread owns its timeline - see RtmConnector.timeline
+            if not getattr(self.api._local, 'timeline', None):
+                self.api.create_timeline()
+        except CircuitOpenError:
+            self._requeue(items)
+            return 0
+        except Exception as err:
+            # Callers block on these futures - never leave one unresolved
+            self._fail(items, err)
+            return 0
+
+        created = 0
+        for i, (name, (data, futures)) in enumerate(items):
+            try:
+                rsp = self.api.post("rtm.tasks.add", data)
+            except CircuitOpenError:
+                # RTM is unhealthy - keep the rest for the next flush
+                self._requeue(items[i:])
+                break
+            except Exception as err:
+                self._fail([(name, (data, futures))], err)
+                continue
+
+            if self.api.task_index is not None:
+                try:
+                    self.api.task_index.apply(rsp)
+                except Exception:
+                    self.api.logger.exception("RtmTaskBatcher: failed to index created task")
+            for future in futures:
+                future.set_result(rsp)
+            created += 1
+
+        if created:
+            self.api.logger.info(f"Created {created} of {len(items)} tasks in one batch")
+        return created
+
+    def _fail(self, items: list, error: Exception) -> None:
+        """
+        Fail the futures of items. Targets using queue_task never read their
+        future, so the failure is logged here as well
+        """
+
+        for name, (_, futures) in items:
+            self.api.logger.error(f"RtmTaskBatcher: failed to create task {name}: {error!r}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+
+    def _requeue(self, items: list) -> None:
+
+        with self._lock:
+            pending = OrderedDict(items)
+            for name, (data, futures) in self._pending.items():
+                if name in pending:
+                    pending[name][1].extend(futures)
+                else:
+                    pending[name] = (data, futures)
+            self._pending = pending
+
+    def _run(self) -> None:
+
+        while True:
+            self._full.wait(self.window)
+            self._full.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.api.logger.exception("RtmTaskBatcher: flush failed")
+
+
+class AsyncRtmApi(RtmApi):
+    """
+    RtmApi with an asyncio transport, for use from AsyncWebhook targets.
+
+    Requests go through one pooled aiohttp session per event loop, created on
+    first use in that loop. Signing, the circuit breaker and metrics are shared with the
+    sync client; the (possibly file-backed) rate limiter and the one-off
+    ensure_ready round-trips run on a worker thread. Requires aiohttp.
+    """
+
+    def __init__(self, app: Flask, logger: Logger, pool_size: int = 100, **kwargs) -> None:
+
+        if aiohttp is None:
+            raise ImportError("AsyncRtmApi requires aiohttp")
+
+        super().__init__(app=app, logger=logger, pool_size=pool_size, **kwargs)
+        self.pool_size = pool_size
+        # aiohttp sessions are bound to the loop they were created in
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> 'aiohttp.ClientSession':
+        """Session for the running event loop"""
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop, None)
+        if client is None or client.closed:
+            if isinstance(self.timeout, tuple):
+                timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0],
+                                                sock_read=self.timeout[1])
+            else:
+                timeout = aiohttp.ClientTimeout(total=self.timeout)
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            client = self._clients[loop] = aiohttp.ClientSession(connector=connector,
+                                                                 timeout=timeout)
+
+        return client
+
+    async def aget(self, method: str = None, params: dict = {}) -> dict:
+        """Async variant of get, returning the decoded response"""
+
+        data = {
+            "method": method,
+            **self.BASE_HEADER,
+            **params
+        }
+        data.update({"api_sig": self._sign_request(data)})
+
+        return await self._arequest('GET', method, data)
+
+    async def apost(self, method: str = None, params: dict = {}) -> dict:
+        """Async variant of post, returning the decoded response"""
+
+        data = {
+            "method": method,
+            **self.BASE_HEADER,
+            "timeline": self.timeline,
+            **params
+        }
+        data.update({"api_sig": self._sign_request(data)})
+
+        return await self._arequest('POST', method, data)
+
+    async def _arequest(self, verb: str, method: str, data: dict) -> dict:
+        """Async counterpart of RtmConnector._request"""
+
+        if self.breaker is not None and not self.breaker.allow():
+            self.metrics.inc('rtm_requests_total', method=method, status='circuit_open')
+            raise CircuitOpenError(f"RTM circuit is open - not calling {method}")
+
+        if self.limiter is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.limiter.acquire)
+
+        # aiohttp only accepts str query values
+        data = {k: v for k, v in data.items() if v is not None}
+
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            async with self.client.request(verb, self.BASE_URL, params=data) as r:
+                status = str(r.status)
+                body = await r.json(content_type=None)
+        finally:
+            if self.breaker is not None:
+                if status == 'error' or status.startswith('5'):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+            self.metrics.inc('rtm_requests_total', method=method, status=status)
+            self.metrics.observe('rtm_request_seconds', time.perf_counter() - start,
+                                 method=method, status=status)
+
+        rsp = body.get('rsp', {}) if isinstance(body, dict) else {}
+        if rsp.get('stat') == 'fail':
+            self.logger.warning(f"RTM - {method} failed: {rsp.get('err')}")
+
+        return body
+
+    async def acreate_task(self, packet: BasePacket) -> Optional[dict]:
+        """Async variant of create_task, usable as an AsyncWebhook target"""
+
+        data = self.task_params(packet)
+
+        if self.task_index is not None:
+            # May run an incremental sync on the blocking client
+            existing = await asyncio.get_running_loop().run_in_executor(
+                None, self.find_existing, packet)
+            if existing is not None:
+                self.logger.info(f"Task already exists: {existing.name}")
+                return None
+
+        try:
+            if not self._ready:
+                await asyncio.get_running_loop().run_in_executor(None, self.ensure_ready)
+            rsp = await self.apost("rtm.tasks.add", data)
+        except CircuitOpenError:
+            self.defer(data)
+            return None
+
+        self.logger.info(f"Created new task: {data['name']}")
+        if self.task_index is not None:
+            self.task_index.apply(rsp)
+        return rsp
+
+    async def aclose(self) -> None:
+        """Release the running loop's session and the sync connection pool"""
+
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+        self.close()
+
+
 class RtmWehook(BaseWebhook):
 
     events: list = [
@@ -0,0 +1,24 @@
+import hashlib
+import hmac
+from typing import Optional, Union
+
+
+def sign(secret: Union[str, bytes], body: bytes) -> str:
+    """GitHub-style signature of a raw body, e.g. 'sha256=ab12...'"""
+
+    if isinstance(secret, str):
+        secret = secret.encode('utf-8')
+
+    return 'sha256=' + hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: Union[str, bytes], body: bytes,
+                     signature: Optional[str]) -> bool:
+    """Constant-time check of a signature header against the raw body"""
+
+    if not signature:
+        return False
+
+    # Compare bytes - compare_digest raises TypeError on non-ASCII str
+    expected = sign(secret, body).encode('ascii')
+    return hmac.compare_digest(expected, signature.encode('utf-8', 'replace'))
@@ -0,0 +1,180 @@
+import json
+import sqlite3
+import time
+from collections import namedtuple
+from threading import Lock
+from typing import Optional
+
+
+SpoolEntry = namedtuple('SpoolEntry', ['id', 'path', 'headers', 'body', 'attempts'])
+
+
+class DeliverySpool(object):
+    """
+    Durable append-only log of raw webhook deliveries, backed by SQLite.
+
+    Entries move through four states:
+        pending  - written by a web process, waiting for a drain worker
+        inflight - claimed by a process; reclaimable once the lease expires
+        done     - acknowledged, kept until `prune` is called
+        failed   - gave up after repeated failures, kept for inspection
+
+    A released entry may carry a `not_before` time, so retries back off
+    rather than being claimed again straight away.
+
+    The database may be shared by any number of processes on the same host.
+    """
+
+    PENDING = 'pending'
+    INFLIGHT = 'inflight'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, path: str = './spool.db', lease: float = 300,
+                 synchronous: str = 'FULL') -> None:
+
+        self.path = path
+        self.lease = lease
+        self._lock = Lock()
+
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={synchronous}")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS deliveries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                received REAL NOT NULL,
+                path TEXT NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                status TEXT NOT NULL,
+                claimed REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                not_before REAL
+            )""")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(deliveries)")]
+        if 'not_before' not in columns:
+            # Spools written before retries backed off
+            self._db.execute("ALTER TABLE deliveries ADD COLUMN not_before REAL")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS deliveries_status ON deliveries (status, id)")
+
+    def append(self, path: str, headers: dict, body: bytes,
+               claim: bool = False) -> int:
+        """
+        Write a raw delivery to the spool and return its id.
+
+        With claim=True the entry is written as inflight, for a caller that
+        intends to dispatch it straight away and `ack` it afterwards.
+        """
+
+        now = time.time()
+        status = self.INFLIGHT if claim else self.PENDING
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO deliveries (received, path, headers, body, status, claimed, attempts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (now, path, json.dumps(headers), body, status,
+                 now if claim else None, 1 if claim else 0))
+
+        return cur.lastrowid
+
+    def claim(self) -> Optional[SpoolEntry]:
+        """Claim the oldest due pending (or abandoned inflight) entry"""
+
+        now = time.time()
+        expired = now - self.lease
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, path, headers, body, attempts FROM deliveries "
+                    "WHERE (status = ? AND (not_before IS NULL OR not_before <= ?)) "
+                    "OR (status = ? AND claimed < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (self.PENDING, now, self.INFLIGHT, expired)).fetchone()
+
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE deliveries SET status = ?, claimed = ?, attempts = attempts + 1 "
+                        "WHERE id = ?",
+                        (self.INFLIGHT, time.time(), row[0]))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+
+        return SpoolEntry(row[0], row[1], json.loads(row[2]), row[3], row[4] + 1)
+
+    def ack(self, entry_id: int) -> None:
+        """Mark an entry as done"""
+
+        with self._lock:
+            self._db.execute("UPDATE deliveries SET status = ? WHERE id = ?",
+                             (self.DONE, entry_id))
+
+    def release(self, entry_id: int, delay: float = 0) -> None:
+        """Return a claimed entry to pending, claimable again after `delay` seconds"""
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE deliveries SET status = ?, claimed = NULL, not_before = ? WHERE id = ?",
+                (self.PENDING, time.time() + delay if delay else None, entry_id))
+
+    def fail(self, entry_id: int) -> None:
+        """Mark an entry as failed - it is kept, but no longer claimed"""
+
+        with self._lock:
+            self._db.execute("UPDATE deliveries SET status = ? WHERE id = ?",
+                             (self.FAILED, entry_id))
+
+    def recover(self) -> int:
+        """
+        Return every inflight entry to pending. Only call this when no other
+        process is dispatching from the spool, e.g. when the sole drain
+        worker starts up after a crash.
+        """
+
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE deliveries SET status = ?, claimed = NULL WHERE status = ?",
+                (self.PENDING, self.INFLIGHT))
+
+        return cur.rowcount
+
+    def pending(self) -> int:
+        """Number of entries still to be dispatched"""
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM deliveries WHERE status IN (?, ?)",
+                (self.PENDING, self.INFLIGHT)).fetchone()
+
+        return row[0]
+
+    def failed(self) -> int:
+        """Number of entries given up on"""
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM deliveries WHERE status = ?",
+                (self.FAILED,)).fetchone()
+
+        return row[0]
+
+    def prune(self, older_than: float = 86400) -> int:
+        """Delete acknowledged entries older than `older_than` seconds"""
+
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM deliveries WHERE status = ? AND received < ?",
+                (self.DONE, time.time() - older_than))
+
+        return cur.rowcount
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,73 @@
+import json
+import os
+from contextlib import contextmanager
+from threading import RLock
+from typing import Any, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class SharedState(object):
+    """
+    Small JSON document on disk, shared between processes on the same host
+    and guarded by an flock on a sidecar lock file. Without fcntl (Windows)
+    only threads within this process are serialised.
+    """
+
+    def __init__(self, path: str) -> None:
+
+        self.path = path
+        self._lock_path = path + '.lock'
+        self._thread_lock = RLock()
+        self._depth = 0
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Hold the cross-process lock, e.g. around a read-check-update"""
+
+        with self._thread_lock:
+            # Re-entrant: only the outermost holder takes the flock
+            if fcntl is None or self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+
+            with open(self._lock_path, 'a') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def read(self) -> dict:
+
+        try:
+            with open(self.path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.read().get(key, default)
+
+    def update(self, **values: Any) -> dict:
+        """Merge values into the document, replacing the file atomically"""
+
+        with self.lock():
+            state = self.read()
+            state.update(values)
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as handle:
+                json.dump(state, handle)
+            os.replace(tmp_path, self.path)
+
+        return state
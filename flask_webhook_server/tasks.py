@@ -0,0 +1,246 @@
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+from threading import RLock
+from typing import Iterator, List, Optional, Tuple, Union
+
+
+class RtmTask(object):
+    """
+    One task of an RTM task series, as returned by rtm.tasks.getList and
+    rtm.tasks.add. Identified by (list_id, series_id, task_id).
+    """
+
+    _fields = ('list_id', 'series_id', 'task_id', 'name', 'url', 'tags',
+               'priority', 'due', 'added', 'completed', 'deleted', 'modified')
+
+    __slots__ = _fields
+
+    def __init__(self, list_id: str, series_id: str, task_id: str, name: str = "",
+                 url: str = "", tags: list = None, priority: str = "N", due: str = "",
+                 added: str = "", completed: str = "", deleted: str = "",
+                 modified: str = "") -> None:
+
+        self.list_id = list_id
+        self.series_id = series_id
+        self.task_id = task_id
+        self.name = name
+        self.url = url or ""
+        self.tags = list(tags or [])
+        self.priority = priority
+        self.due = due or ""
+        self.added = added or ""
+        self.completed = completed or ""
+        self.deleted = deleted or ""
+        self.modified = modified or ""
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return (self.list_id, self.series_id, self.task_id)
+
+    @property
+    def open(self) -> bool:
+        """Neither completed nor deleted"""
+        return not (self.completed or self.deleted)
+
+    @classmethod
+    def from_series(cls, list_id: str, series: dict) -> List['RtmTask']:
+        """Every task of a taskseries element"""
+
+        tags = series.get('tags') or {}
+        if isinstance(tags, dict):
+            tags = tags.get('tag', [])
+
+        tasks = []
+        for task in _as_list(series.get('task')):
+            tasks.append(cls(list_id, series['id'], task['id'],
+                             name=series.get('name', ""),
+                             url=series.get('url', ""),
+                             tags=_as_list(tags),
+                             priority=task.get('priority', "N"),
+                             due=task.get('due', ""),
+                             added=task.get('added', ""),
+                             completed=task.get('completed', ""),
+                             deleted=task.get('deleted', ""),
+                             modified=series.get('modified', "")))
+
+        return tasks
+
+    def to_dict(self) -> dict:
+        return dict([(field, getattr(self, field)) for field in self._fields])
+
+    def __repr__(self) -> str:
+        return f"RtmTask({self.name!r}, key={self.key})"
+
+
+class TaskIndex(object):
+    """
+    Local copy of the user's RTM tasks, indexed by name, URL and tag.
+
+    Kept current from rtm.tasks.getList responses via `apply`; `last_sync` is
+    the value to pass back as getList's last_sync for the next delta. With
+    `path` set, tasks and last_sync are persisted to SQLite and reloaded on
+    start, so a restart only fetches what changed in the meantime.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+
+        self._tasks: dict = {}
+        self._by_name: dict = {}
+        self._by_url: dict = {}
+        self._by_tag: dict = {}
+        self._lock = RLock()
+
+        self.last_sync: Optional[str] = None
+        self.synced_at = 0.0
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, timeout=10, isolation_level=None,
+                                       check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " list_id TEXT, series_id TEXT, task_id TEXT, data TEXT NOT NULL,"
+                " PRIMARY KEY (list_id, series_id, task_id))")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._load()
+
+    def apply(self, rsp: dict) -> int:
+        """
+        Merge an rtm.tasks.getList or rtm.tasks.add response into the index,
+        returning the number of tasks added, changed or removed
+        """
+
+        lists = ((rsp or {}).get('rsp', {}).get('tasks', {}) or {}).get('list', None)
+        if lists is None:
+            # rtm.tasks.add and friends return a single list element
+            lists = (rsp or {}).get('rsp', {}).get('list', None)
+
+        changed = []
+        removed = []
+        for element in _as_list(lists):
+            list_id = element['id']
+            for series in _as_list(element.get('taskseries')):
+                changed.extend(RtmTask.from_series(list_id, series))
+
+            deleted = element.get('deleted') or {}
+            for series in _as_list(deleted.get('taskseries') if isinstance(deleted, dict) else None):
+                for task in _as_list(series.get('task')):
+                    removed.append((list_id, series['id'], task['id']))
+
+        with self._lock:
+            for task in changed:
+                self._add(task)
+            for key in removed:
+                self._remove(key)
+
+            if self._db is not None and (changed or removed):
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)",
+                        [(*task.key, json.dumps(task.to_dict())) for task in changed])
+                    self._db.executemany(
+                        "DELETE FROM tasks WHERE list_id = ? AND series_id = ? AND task_id = ?",
+                        removed)
+
+        return len(changed) + len(removed)
+
+    def mark_synced(self, started: float) -> None:
+        """Record a completed sync that was requested at `started` (epoch)"""
+
+        last_sync = datetime.fromtimestamp(started, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        with self._lock:
+            self.last_sync = last_sync
+            self.synced_at = time.time()
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('last_sync', ?)",
+                                 (last_sync,))
+
+    def find(self, name: str = None, url: str = None, tags: Union[str, list] = None,
+             include_closed: bool = False) -> List[RtmTask]:
+        """Tasks matching every given criterion - open tasks only by default"""
+
+        with self._lock:
+            keys = None
+            if name is not None:
+                keys = self._match(keys, self._by_name.get(name.casefold(), ()))
+            if url is not None:
+                keys = self._match(keys, self._by_url.get(url, ()))
+            for tag in _as_list(tags):
+                keys = self._match(keys, self._by_tag.get(tag, ()))
+
+            if keys is None:
+                keys = self._tasks.keys()
+
+            tasks = [self._tasks[key] for key in keys]
+
+        if not include_closed:
+            tasks = [task for task in tasks if task.open]
+        return tasks
+
+    def exists(self, name: str, url: str = None) -> bool:
+        """True if an open task with this name (and URL, if given) is indexed"""
+
+        return bool(self.find(name=name, url=url or None))
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __iter__(self) -> Iterator[RtmTask]:
+        with self._lock:
+            return iter(list(self._tasks.values()))
+
+    @staticmethod
+    def _match(keys: Optional[set], candidates: set) -> set:
+        return set(candidates) if keys is None else keys & candidates
+
+    def _add(self, task: RtmTask) -> None:
+
+        self._remove(task.key)
+        self._tasks[task.key] = task
+        self._by_name.setdefault(task.name.casefold(), set()).add(task.key)
+        if task.url:
+            self._by_url.setdefault(task.url, set()).add(task.key)
+        for tag in task.tags:
+            self._by_tag.setdefault(tag, set()).add(task.key)
+
+    def _remove(self, key: tuple) -> None:
+
+        task = self._tasks.pop(key, None)
+        if task is None:
+            return
+
+        _discard(self._by_name, task.name.casefold(), key)
+        _discard(self._by_url, task.url, key)
+        for tag in task.tags:
+            _discard(self._by_tag, tag, key)
+
+    def _load(self) -> None:
+
+        for (data,) in self._db.execute("SELECT data FROM tasks"):
+            self._add(RtmTask(**json.loads(data)))
+
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'last_sync'").fetchone()
+        if row is not None:
+            self.last_sync = row[0]
+
+
+def _as_list(value) -> list:
+
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _discard(index: dict, value: str, key: tuple) -> None:
+
+    keys = index.get(value, None)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[value]
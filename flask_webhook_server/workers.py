@@ -0,0 +1,58 @@
+import queue
+from threading import Thread
+from typing import Callable
+from logging import Logger
+
+
+class WorkerPool(object):
+    """
+    Bounded in-process worker pool for acknowledge-then-process webhooks.
+
+    Jobs are zero-argument callables. `submit` never blocks - if the queue is
+    full it returns False so the caller can apply backpressure.
+    """
+
+    def __init__(self,
+                 logger: Logger,
+                 workers: int = 4,
+                 queue_size: int = 64,
+                 retry_after: int = 5
+                 ) -> None:
+
+        self.logger = logger
+        self.retry_after = retry_after
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+
+        for i in range(workers):
+            thread = Thread(target=self._work, name=f"webhook-worker-{i}",
+                            daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, job: Callable) -> bool:
+        """Enqueue a job, returning False if the queue is full"""
+
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            self.logger.warning("WorkerPool: queue full - rejecting job")
+            return False
+
+        return True
+
+    def join(self) -> None:
+        """Block until every queued job has been processed"""
+
+        self.queue.join()
+
+    def _work(self) -> None:
+
+        while True:
+            job = self.queue.get()
+            try:
+                job()
+            except Exception:
+                self.logger.exception("WorkerPool: job failed")
+            finally:
+                self.queue.task_done()
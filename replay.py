@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""
+Replay captured webhook traffic against a running server.
+
+    python replay.py 'captures/*.jsonl' --url http://localhost:5000 --speed 1
+    python replay.py 'captures/*.jsonl' --url http://localhost:5000 --speed 0 --concurrency 16
+"""
+import argparse
+import json
+import time
+
+from flask_webhook_server.capture import read_captures, replay
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Replay captured webhook deliveries")
+    parser.add_argument('captures', nargs='+', help="capture files or glob patterns")
+    parser.add_argument('--url', default='http://localhost:5000',
+                        help="base URL of the server to send to")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="1 for real time, N for N times faster, 0 for as fast as possible")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="requests in flight at once")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    statuses = replay(read_captures(args.captures), args.url, speed=args.speed,
+                      concurrency=args.concurrency)
+    elapsed = time.perf_counter() - start
+
+    total = sum(statuses.values())
+    print(json.dumps({
+        'deliveries': total,
+        'seconds': round(elapsed, 3),
+        'throughput': round(total / elapsed, 1) if elapsed else None,
+        'statuses': statuses,
+    }, indent=2))
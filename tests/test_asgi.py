@@ -0,0 +1,48 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from flask_webhook_server import AsyncGithubWebhook
+
+BODY = json.dumps({'action': 'created', 'repository': {'name': 'r', 'full_name': 'o/r'},
+                   'sender': {'login': 'u'}}).encode('utf-8')
+
+
+def call(webhook: AsyncGithubWebhook, length: bytes) -> int:
+    """Send one star delivery with the given Content-Length, returning the status"""
+
+    messages = []
+
+    async def receive() -> dict:
+        return {'type': 'http.request', 'body': BODY, 'more_body': False}
+
+    async def send(message: dict) -> None:
+        messages.append(message)
+
+    scope = {'type': 'http', 'path': '/github', 'method': 'POST',
+             'headers': [(b'x-github-event', b'star'), (b'content-length', length)]}
+    asyncio.run(webhook(scope, receive, send))
+    return messages[0]['status']
+
+
+@pytest.fixture
+def webhook() -> AsyncGithubWebhook:
+
+    github = AsyncGithubWebhook(logging.getLogger(__name__))
+    github.register(('star', 'created'), lambda packet: None)
+    github.hook('/github', max_size=1024)(lambda: None)
+    return github
+
+
+def test_content_length(webhook):
+
+    assert call(webhook, str(len(BODY)).encode('ascii')) == 200
+    assert call(webhook, b'4096') == 413
+
+
+@pytest.mark.parametrize('length', [b'abc', b'\xb2', b'-1', b'1_0', b''])
+def test_malformed_content_length(webhook, length):
+
+    assert call(webhook, length) == 400
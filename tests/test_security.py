@@ -0,0 +1,39 @@
+import json
+
+from flask import Flask
+
+from flask_webhook_server import GithubWebhook
+from flask_webhook_server.security import sign, verify_signature
+
+SECRET = 'It\'s a Secret to Everybody'
+BODY = b'{"action": "created"}'
+
+
+def test_verify_signature():
+
+    assert verify_signature(SECRET, BODY, sign(SECRET, BODY))
+    assert not verify_signature(SECRET, BODY, sign('other', BODY))
+    assert not verify_signature(SECRET, BODY, None)
+
+
+def test_verify_signature_non_ascii():
+
+    assert not verify_signature(SECRET, BODY, 'sha256=éé')
+    assert not verify_signature(SECRET, BODY, 'sha256=☃')
+
+
+def test_non_ascii_signature_header_is_rejected():
+
+    app = Flask(__name__)
+    github = GithubWebhook(app, app.logger)
+    github.register(('star', 'created'), lambda packet: None)
+    github.hook('/github', methods=['POST'], secret=SECRET)(lambda: None)
+
+    body = json.dumps({'action': 'created', 'repository': {'name': 'r', 'full_name': 'o/r'},
+                       'sender': {'login': 'u'}}).encode('utf-8')
+    rsp = app.test_client().post('/github', data=body, headers={
+        'X-GitHub-Event': 'star',
+        'X-Hub-Signature-256': 'sha256=été',
+    })
+
+    assert rsp.status_code == 401
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Drain worker for the delivery spool.
+
+Runs alongside the web process (it must share the WEBHOOK_SPOOL file), picks
+up spooled deliveries and dispatches them to the targets registered in app.py.
+Unacknowledged inflight entries are replayed on start, and failed entries are
+retried with backoff, then kept as failed.
+
+Pass --no-recover when web processes also dispatch inline (WEBHOOK_SPOOL_ONLY
+unset), so their inflight entries are left to expire on their lease instead.
+
+    WEBHOOK_SPOOL=./spool.db python worker.py [--no-recover] [--once]
+"""
+import argparse
+
+from app import app, github
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Drain the webhook delivery spool")
+    parser.add_argument('--poll', type=float, default=1.0,
+                        help="seconds to wait when the spool is empty")
+    parser.add_argument('--max-attempts', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=2.0,
+                        help="seconds before the first retry, doubled on each attempt")
+    parser.add_argument('--no-recover', dest='recover', action='store_false',
+                        help="leave inflight entries to their lease - when a web process dispatches inline")
+    parser.add_argument('--once', action='store_true',
+                        help="exit once the spool is empty")
+    args = parser.parse_args()
+
+    if github.spool is None:
+        parser.error("WEBHOOK_SPOOL is not set")
+
+    if args.recover:
+        recovered = github.spool.recover()
+        app.logger.info(f'Recovered {recovered} unacknowledged deliveries')
+
+    app.logger.info(f'Draining spool - {github.spool.pending()} pending, '
+                    f'{github.spool.failed()} failed')
+    handled = github.drain(poll=args.poll, max_attempts=args.max_attempts,
+                           once=args.once, backoff=args.backoff)
+    app.logger.info(f'Drained {handled} deliveries')